@@ -1,17 +1,136 @@
 import os
 import sys
 import re
+import time
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import argparse
+import asyncio
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import quote, urlsplit, parse_qsl
 
 from ngos_list import ngos_list
+from ngo_matcher import get_matcher
+from rate_limiter import RateLimiter
+from response_cache import add_cache_arguments, cache_from_args
+from scrape_state import add_state_arguments, state_from_args, is_newer, mark_to_rfc3339
+from normalize import normalize_timestamps, valid_dates
+from sinks import add_sink_arguments, sinks_from_args
 
 # Set the BlueSky platform_id.
 # IMPORTANT: Update this value to match your database. For example, if you set BlueSky to id 3, then leave it as is.
 PLATFORM_ID = 3
 
+# Maximum number of posts the searchPosts endpoint returns per page.
+MAX_RESULTS_PER_PAGE = 100
+
+# Define the HTTP settings of the BlueSky client
+DEFAULT_TIMEOUT = 10          # Seconds to wait for a response
+DEFAULT_MAX_RETRIES = 5       # Retries on 429, 5xx and connection errors
+DEFAULT_BACKOFF_FACTOR = 1.0  # Base delay in seconds, doubled after each retry
+MAX_BACKOFF = 60              # Longest delay in seconds between two attempts
+DEFAULT_POOL_SIZE = 20        # Connections kept alive to the API host
+DEFAULT_REQUESTS_PER_SECOND = 8  # Global request rate across all concurrent searches
+
+# Define the number of keyword searches run concurrently during the NGO sweep
+DEFAULT_CONCURRENCY = 10
+
+# Define the number of date window slices of one keyword fetched in parallel
+DEFAULT_SHARD_WORKERS = 4
+
+# Define the maximum depth of replies and the maximum number of replies to scrape per post
+DEFAULT_MAX_COMMENT_DEPTH = 2
+DEFAULT_MAX_COMMENTS_PER_POST = 30
+
+class BlueskyClient:
+    """
+    HTTP client for the public BlueSky API.
+    Reuses keep-alive connections through a pooled requests.Session, applies a timeout
+    to every request and retries 429 and 5xx responses with exponential backoff,
+    waiting for the 'ratelimit-reset' time when the API provides one.
+    The session may be shared by several threads, which together send at most
+    'requests_per_second' requests per second.
+    Pass a ResponseCache as 'cache' to serve repeated requests from disk.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, pool_size=DEFAULT_POOL_SIZE,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND, cache=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def retry_delay(self, attempt, response=None):
+        """
+        Return the number of seconds to wait before retrying a request.
+        The exponential backoff is capped at MAX_BACKOFF, but a later 'ratelimit-reset' is always honoured.
+        """
+        delay = min(self.backoff_factor * (2 ** attempt) * (1 + random.random() * 0.1), MAX_BACKOFF)
+        if response is not None and response.headers.get('ratelimit-reset'):
+            try:
+                delay = max(delay, float(response.headers['ratelimit-reset']) - time.time())
+            except ValueError:
+                pass
+        return delay
+
+    def get_json(self, url):
+        """
+        Send a GET request and return the decoded JSON response, or the cached one if available.
+        Raises the last error once all retries are exhausted.
+        """
+        if self.cache is None:
+            return self.fetch_json(url)
+        # Cache by XRPC method (e.g. 'app.bsky.feed.searchPosts') and query parameters.
+        parts = urlsplit(url)
+        endpoint = parts.path.rsplit('/', 1)[-1]
+        params = sorted(parse_qsl(parts.query, keep_blank_values=True))
+        return self.cache.fetch(endpoint, params, lambda: self.fetch_json(url))
+
+    def fetch_json(self, url):
+        """
+        Send a GET request to the API and return the decoded JSON response.
+        Raises the last error once all retries are exhausted, and an HTTPError right away for
+        other unsuccessful responses, so that error bodies never reach the response cache.
+        """
+        for attempt in range(self.max_retries + 1):
+            response = None
+            self.rate_limiter.wait()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    response.raise_for_status()
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay(attempt, response)
+                print(f"Request failed ({e}); retrying in {delay:.1f}s...")
+                time.sleep(delay)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"{response.status_code} response for url: {url}", response=response)
+        return response.json()
+
+# Shared BlueSky client, created on first use by get_bluesky_client()
+bluesky_client = None
+
+def get_bluesky_client():
+    """
+    Return the shared BlueSky client, creating it on first use.
+    """
+    global bluesky_client
+    if bluesky_client is None:
+        bluesky_client = BlueskyClient()
+    return bluesky_client
+
 def setup_parser():
     """
     Set up and return parser to retrieve command line arguments.
@@ -29,7 +148,7 @@ def setup_parser():
         "--max_results",
         type=int,
         default=10,
-        help="Number of posts to retrieve for each keyword. Default is 10."
+        help="Number of posts to retrieve for each keyword, following result pages as needed. Default is 10."
     )
     parser.add_argument(
         "--sort_method",
@@ -51,6 +170,70 @@ def setup_parser():
         default=0,
         help=("Number of days before and after target_date to include. Defaults to 0, meaning only the given day is scraped.")
     )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f"Seconds to wait for each API response. Default is {DEFAULT_TIMEOUT}."
+    )
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f"Retries for rate-limited or failed API requests. Default is {DEFAULT_MAX_RETRIES}."
+    )
+    parser.add_argument(
+        "--shard",
+        choices=["none", "day", "hour"],
+        default="none",
+        help=("Split the target date window into per-day or per-hour searches fetched in parallel, "
+              "spreading --max_results evenly over the window. Requires --target_date. Default is 'none'.")
+    )
+    parser.add_argument(
+        "--skip_comments",
+        action="store_true",
+        help="Do not fetch reply threads; comments.csv is then created empty."
+    )
+    parser.add_argument(
+        "--max_comment_depth",
+        type=int,
+        default=DEFAULT_MAX_COMMENT_DEPTH,
+        help=f"Maximum depth of replies to scrape per post. Default is {DEFAULT_MAX_COMMENT_DEPTH}."
+    )
+    parser.add_argument(
+        "--max_comments",
+        type=int,
+        default=DEFAULT_MAX_COMMENTS_PER_POST,
+        help=f"Maximum number of replies to scrape per post. Default is {DEFAULT_MAX_COMMENTS_PER_POST}."
+    )
+    parser.add_argument(
+        "--plan_queries",
+        action="store_true",
+        help=("When sweeping all NGOs, search only keywords not already covered by a broader keyword "
+              "and attribute posts to NGOs by matching their text locally.")
+    )
+    parser.add_argument(
+        "--combine_queries",
+        type=int,
+        default=1,
+        help=("With --plan_queries, OR together up to this many phrases per search request. "
+              "Default is 1 (one phrase per request).")
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Number of keyword searches run at the same time when sweeping all NGOs. Default is {DEFAULT_CONCURRENCY}."
+    )
+    parser.add_argument(
+        "--requests_per_second",
+        type=float,
+        default=DEFAULT_REQUESTS_PER_SECOND,
+        help=f"Maximum API requests per second across all searches. Default is {DEFAULT_REQUESTS_PER_SECOND}."
+    )
+    add_cache_arguments(parser)
+    add_state_arguments(parser)
+    add_sink_arguments(parser)
     return parser
 
 def extract_url(uri):
@@ -70,14 +253,27 @@ def extract_url(uri):
     post_id = uri_parts[-1]
     return f"https://bsky.app/profile/{DID}/post/{post_id}"
 
-def get_api_url(keyword, max_results, sort_method, target_date, date_range):
+def get_api_url(keyword, max_results, sort_method, target_date, date_range, cursor=None, window=None, since=None):
     """
     Construct and return the BlueSky API URL for a given keyword and date range.
+    Pass the 'cursor' returned by a previous response to get the next page of results.
+    Pass a (since, until) 'window' to search an explicit time slice instead of the target date range.
+    Without a window or target date, 'since' limits the results to posts after that time.
     """
     if not keyword:
         print("Keyword not provided")
         return None
-    if target_date:
+    # Keywords are searched as exact phrases; planned queries arrive already quoted.
+    query = keyword if keyword.startswith('"') else f'"{keyword}"'
+    # Encode the whole query, so that '&', '#' or '+' in a keyword cannot break the query string
+    query = quote(query, safe='')
+    if window:
+        start_date, end_date = window
+        api_url = (
+            f"https://public.api.bsky.app/xrpc/app.bsky.feed.searchPosts?q={query}"
+            f"&limit={max_results}&since={start_date}&until={end_date}"
+        )
+    elif target_date:
         try:
             target_date_obj = datetime.strptime(target_date, "%Y-%m-%d")
         except Exception as e:
@@ -89,203 +285,478 @@ def get_api_url(keyword, max_results, sort_method, target_date, date_range):
         start_date = (target_date_obj - timedelta(days=date_range)).strftime("%Y-%m-%dT%H:%M:%SZ")
         end_date = (target_date_obj + timedelta(days=date_range)).strftime("%Y-%m-%dT%H:%M:%SZ")
         api_url = (
-            f"https://public.api.bsky.app/xrpc/app.bsky.feed.searchPosts?q=\"{keyword}\""
+            f"https://public.api.bsky.app/xrpc/app.bsky.feed.searchPosts?q={query}"
             f"&limit={max_results}&since={start_date}&until={end_date}"
         )
         print(f"Got API URL for keyword '{keyword}' for dates {start_date} to {end_date}. ", end="")
     else:
         api_url = (
-            f"https://public.api.bsky.app/xrpc/app.bsky.feed.searchPosts?q=\"{keyword}\""
+            f"https://public.api.bsky.app/xrpc/app.bsky.feed.searchPosts?q={query}"
             f"&limit={max_results}&sort={sort_method}"
         )
+        if since:
+            api_url += f"&since={since}"
+    if cursor:
+        api_url += f"&cursor={quote(cursor)}"
     return api_url
 
-def parse_bsky_date(raw_date):
+def post_to_record(post):
     """
-    Parse BlueSky's raw date string and return it formatted as "YYYY-MM-DD HH:MM:SS".
-    Handles fractional seconds (truncates to 6 digits) and timezone offsets.
-    Returns an empty string on failure.
+    Convert a BlueSky post view to a record following the unified schema.
+    'published_at' holds the raw createdAt date until normalize_timestamps formats the batch.
+    Returns None if the post has no URI or text.
     """
-    if not raw_date:
-        return ""
-    
-    # Use regex to truncate any extra fractional digits to 6 digits
-    # Example: "2025-04-14T13:50:14.61812900+00:00" -> "2025-04-14T13:50:14.618129+00:00"
-    pattern = r"(.*\.\d{6})\d*(.*)"
-    raw_date = re.sub(pattern, r"\1\2", raw_date)
+    if not post.get('uri'):
+        print("Post missing URI; skipping.")
+        return None
+    text_content = post['record'].get('text')
+    if not text_content:
+        print("Post missing text content; skipping.")
+        return None
 
-    try:
-        # Convert 'Z' notation to a timezone offset that fromisoformat() can handle
-        if raw_date.endswith("Z"):
-            raw_date = raw_date.replace("Z", "+00:00")
-        dt = datetime.fromisoformat(raw_date)
-        return dt.strftime("%Y-%m-%d %H:%M:%S")
-    except Exception as e:
-        print(f"Error parsing date '{raw_date}':", e)
-        return ""
+    return {
+        'external_content_id': post['uri'],
+        'platform_id': PLATFORM_ID,
+        'title': "",                          # BlueSky posts don't have a title
+        'description': text_content,
+        'url': extract_url(post['uri']),
+        'author': post['author']['handle'],
+        'published_at': post['record'].get('createdAt'),
+        'view_count': 0,                      # Default value
+        'like_count': post.get('likeCount', 0),
+        'comment_count': post.get('replyCount', 0),
+        'content_type': 'Post',
+        'metadata': "{}"                      # Empty JSON object as string
+    }
 
-def scrape_posts(keyword, max_results, sort_method, target_date=None, date_range=None):
+def scrape_posts(keyword, max_results, sort_method, target_date=None, date_range=None, client=None, window=None,
+                 newer_than=None):
     """
     Scrape posts from BlueSky using the given keyword and optional date parameters.
-    Returns a list of records following the unified schema.
+    Follows the response cursor page by page until 'max_results' posts are found or
+    results run out, yielding records following the unified schema as they arrive.
+    Requests go through 'client', or the shared BlueSky client if not given.
+    An explicit (since, until) 'window' overrides the target date range.
+    With 'newer_than' (a published_at mark), only newer posts are yielded, and paging
+    stops at the first known post when results are ordered by date.
     """
-    api_url = get_api_url(keyword, max_results, sort_method, target_date, date_range)
-    if not api_url:
-        return None
+    client = client or get_bluesky_client()
+    found = 0
+    cursor = None
+    since = mark_to_rfc3339(newer_than) if newer_than else None
+    # Date-bounded searches are always ordered by date, newest first.
+    ordered_by_date = sort_method == "latest" or window or target_date
+    reached_known = False
     print("Scraping posts...", end="")
-    try:
-        response = requests.get(api_url)
-        data = response.json()
-    except Exception as e:
-        print("Error during API request:", e)
-        return None
-
-    posts_data = []
-    if 'posts' not in data:
-        print(f"API response did not include 'posts' key for URL: {api_url}")
-        return None
 
-    for post in data['posts']:
+    while found < max_results:
+        api_url = get_api_url(keyword, min(MAX_RESULTS_PER_PAGE, max_results - found), sort_method,
+                              target_date, date_range, cursor, window, since)
+        if not api_url:
+            return
         try:
-            if not post.get('uri'):
-                print("Post missing URI; skipping.")
+            data = client.get_json(api_url)
+        except Exception as e:
+            print("Error during API request:", e)
+            return
+
+        if 'posts' not in data:
+            print(f"API response did not include 'posts' key for URL: {api_url}")
+            return
+
+        records = []
+        for post in data['posts']:
+            try:
+                record = post_to_record(post)
+            except Exception as e:
+                print("Error processing a post:", e)
                 continue
-            text_content = post['record'].get('text')
-            if not text_content:
-                print("Post missing text content; skipping.")
+            if record:
+                records.append(record)
+        normalize_timestamps(records, 'published_at')
+
+        for record in records:
+            if not is_newer(record['published_at'], newer_than):
+                if ordered_by_date:
+                    reached_known = True  # Everything after this post was seen by a previous run
+                    break
                 continue
+            found += 1
+            yield record
+            if found >= max_results:
+                break
 
-            raw_date = post['record'].get('createdAt')
-            formatted_date = ""
-            if raw_date and raw_date != "0000-00-00 00:00:00":
-                formatted_date = parse_bsky_date(raw_date)
-
-            record = {
-                'external_content_id': post['uri'],
-                'platform_id': PLATFORM_ID,
-                'title': "",                          # BlueSky posts don't have a title
-                'description': text_content,
-                'url': extract_url(post['uri']),
-                'author': post['author']['handle'],
-                'published_at': formatted_date,
-                'view_count': 0,                      # Default value
-                'like_count': post.get('likeCount', 0),
-                'comment_count': post.get('replyCount', 0),
-                'content_type': 'Post',
-                'metadata': "{}"                      # Empty JSON object as string
-            }
-            posts_data.append(record)
-        except Exception as e:
-            print("Error processing a post:", e)
-            continue
-    print(f"Found {len(posts_data)} posts.")
-    return posts_data
+        cursor = data.get('cursor')
+        if reached_known or not cursor or not data['posts']:
+            break  # No more pages
+
+    print(f"Found {found} posts.")
 
-def save_content_to_csv(posts_data, filename="content.csv"):
+def plan_date_shards(target_date, date_range, shard="day"):
     """
-    Save the scraped posts data to 'content.csv' following the unified schema.
-    Filters out posts with invalid or missing published_at dates.
+    Split the days from target_date - date_range to target_date + date_range (inclusive)
+    into per-day or per-hour (since, until) slices, newest first.
+    Returns None if the target date or range is invalid.
     """
-    if not posts_data:
-        print("No posts found; content CSV not created.")
+    try:
+        target_date_obj = datetime.strptime(target_date, "%Y-%m-%d")
+    except Exception:
+        print("Invalid target_date. Use YYYY-MM-DD format.")
+        return None
+    if date_range < 0:
+        print("Date range cannot be negative.")
+        return None
+
+    step = timedelta(hours=1) if shard == "hour" else timedelta(days=1)
+    start = target_date_obj - timedelta(days=date_range)
+    end = target_date_obj + timedelta(days=date_range + 1)
+    shards = []
+    while start < end:
+        shards.append((start.strftime("%Y-%m-%dT%H:%M:%SZ"), (start + step).strftime("%Y-%m-%dT%H:%M:%SZ")))
+        start += step
+    shards.reverse()
+    return shards
+
+def scrape_posts_sharded(keyword, max_results, sort_method, target_date, date_range, shard="day",
+                         client=None, max_workers=DEFAULT_SHARD_WORKERS, newer_than=None):
+    """
+    Scrape posts for a keyword with the date window split into per-day or per-hour slices,
+    so that busy keywords are covered across the whole window rather than only its newest day.
+    'max_results' is spread evenly over the slices, which are fetched in parallel; with fewer
+    results than slices, only 'max_results' slices spread evenly across the window are searched.
+    With 'newer_than', slices ending before that mark are skipped.
+    Yields records taken round-robin from the slices, newest slice first, deduplicated by post URI.
+    """
+    shards = plan_date_shards(target_date, date_range, shard)
+    if shards and newer_than:
+        since = mark_to_rfc3339(newer_than)
+        shards = [window for window in shards if window[1] > since]
+    if not shards or max_results <= 0:
         return
+    if max_results < len(shards):
+        # One result per slice: search every n-th slice, from the newest to the oldest
+        step = (len(shards) - 1) / max(1, max_results - 1)
+        shards = [shards[round(i * step)] for i in range(max_results)]
+    per_shard = -(-max_results // len(shards))  # Ceiling division
+
+    def scrape_shard(window):
+        return list(scrape_posts(keyword, per_shard, sort_method, client=client, window=window,
+                                 newer_than=newer_than))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        posts_by_shard = list(executor.map(scrape_shard, shards))
+
+    # Take the slices' posts in turns, so that rounding up per_shard does not favour the newest slices
+    seen_uris = set()
+    found = 0
+    for rank in range(per_shard):
+        for posts in posts_by_shard:
+            if found >= max_results:
+                return
+            if rank >= len(posts) or posts[rank]['external_content_id'] in seen_uris:
+                continue
+            seen_uris.add(posts[rank]['external_content_id'])
+            found += 1
+            yield posts[rank]
+
+def search_keyword(keyword, max_results, sort_method, target_date=None, date_range=None, shard=None, client=None,
+                   newer_than=None):
+    """
+    Search posts for a keyword, sharding the date window if 'shard' is 'day' or 'hour'.
+    With 'newer_than' (a published_at mark), only posts published after it are returned.
+    Returns a list of records following the unified schema.
+    """
+    if shard in ("day", "hour") and target_date:
+        return list(scrape_posts_sharded(keyword, max_results, sort_method, target_date, date_range, shard, client,
+                                         newer_than=newer_than))
+    return list(scrape_posts(keyword, max_results, sort_method, target_date, date_range, client,
+                             newer_than=newer_than))
+
+def get_thread_api_url(post_uri, depth):
+    """
+    Construct and return the BlueSky API URL for the reply thread of a post, 'depth' levels deep.
+    """
+    return (
+        f"https://public.api.bsky.app/xrpc/app.bsky.feed.getPostThread?uri={quote(post_uri, safe='')}"
+        f"&depth={depth}&parentHeight=0"
+    )
+
+def reply_to_comment(reply_post, post_uri):
+    """
+    Convert a reply post view to a record following the comments schema.
+    'created_at' holds the raw createdAt date until normalize_timestamps formats the batch.
+    """
+    record = reply_post.get('record', {})
+    return {
+        'comment_id': reply_post['uri'],
+        'post_external_id': post_uri,
+        'author': reply_post.get('author', {}).get('handle'),
+        'body': record.get('text', ""),
+        'created_at': record.get('createdAt'),
+        'like_count': reply_post.get('likeCount', 0),
+        'reply_count': reply_post.get('replyCount', 0),
+        'parent_id': record.get('reply', {}).get('parent', {}).get('uri'),
+        'metadata': "{}"
+    }
+
+def scrape_post_replies(post_uri, max_depth=DEFAULT_MAX_COMMENT_DEPTH, max_replies=DEFAULT_MAX_COMMENTS_PER_POST,
+                        client=None):
+    """
+    Fetch the reply thread of a post in one getPostThread request and return up to
+    'max_replies' replies, at most 'max_depth' levels deep, breadth first.
+    """
+    client = client or get_bluesky_client()
+    try:
+        data = client.get_json(get_thread_api_url(post_uri, max_depth))
+    except Exception as e:
+        print(f"Error fetching replies for post '{post_uri}':", e)
+        return []
+
+    comments = []
+    level = data.get('thread', {}).get('replies', [])
+    depth = 1
+    while level and depth <= max_depth and len(comments) < max_replies:
+        next_level = []
+        for node in level:
+            # Deleted or blocked replies come back without a post view
+            reply_post = node.get('post')
+            if not reply_post:
+                continue
+            try:
+                comments.append(reply_to_comment(reply_post, post_uri))
+            except Exception as e:
+                print("Error processing a reply:", e)
+                continue
+            if len(comments) >= max_replies:
+                break
+            next_level.extend(node.get('replies', []))
+        level = next_level
+        depth += 1
+    return normalize_timestamps(comments, 'created_at')
 
-    # Filter out records that do not have a valid published_at date.
-    valid_posts = []
-    for post in posts_data:
-        if post['published_at'] and post['published_at'] != '0000-00-00 00:00:00':
-            valid_posts.append(post)
-            
-    invalid_count = len(posts_data) - len(valid_posts)
-    if invalid_count:
-        print(f"Warning: {invalid_count} posts with invalid or missing dates were filtered out.")
-
-    if not valid_posts:
-        print("No valid posts found; content CSV not created.")
+def scrape_comments(post_uris, max_depth=DEFAULT_MAX_COMMENT_DEPTH, max_replies=DEFAULT_MAX_COMMENTS_PER_POST,
+                    concurrency=DEFAULT_CONCURRENCY, client=None):
+    """
+    Fetch the replies of many posts concurrently, given the URIs of posts with replies.
+    Yields the comment records of each post as a list, in the order of the posts.
+    """
+    post_uris = list(dict.fromkeys(post_uris))
+    if not post_uris:
         return
+    print(f"Fetching replies for {len(post_uris)} posts with replies...")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        yield from executor.map(lambda uri: scrape_post_replies(uri, max_depth, max_replies, client), post_uris)
+
+def keyword_tokens(keyword):
+    """
+    Return the lower-cased words of a keyword, as the search engine tokenizes phrases.
+    """
+    return tuple(re.findall(r"\w+", keyword.lower()))
+
+def contains_phrase(tokens, phrase_tokens):
+    """
+    Check whether the words of a phrase appear consecutively in the given words.
+    """
+    n = len(phrase_tokens)
+    return any(tokens[i:i + n] == phrase_tokens for i in range(len(tokens) - n + 1))
 
-    df = pd.DataFrame(valid_posts)
-    cols = [
-        'external_content_id', 'platform_id', 'title', 'description', 'url', 'author',
-        'published_at', 'view_count', 'like_count', 'comment_count', 'content_type', 'metadata'
+def keyword_queries(ngos_list):
+    """
+    Return one search query per keyword of every NGO, attributing each query's posts to its NGO.
+    """
+    return [
+        {'query': kw, 'phrases': [kw], 'keywords': [], 'ngo_ids': {ngo['ngo_id']}, 'max_results_factor': 1}
+        for ngo in ngos_list for kw in ngo.get('keywords', [])
     ]
-    df = df[cols]
-    df.to_csv(filename, index=False, encoding='utf-8-sig')
-    print(f"Content data saved to {filename}")
 
-def save_ngo_content_to_csv(ngo_content_data, filename="ngo_content.csv"):
+def plan_keyword_queries(ngos_list, combine=1):
     """
-    Save NGO-to-post mapping data to 'ngo_content.csv'.
-    Expected columns: ngo_id, external_content_id.
+    Build a minimal set of search queries covering every keyword of every NGO.
+    A phrase search also returns the posts of every longer keyword containing that phrase
+    ('Red Cross' covers 'American Red Cross'), so only keywords containing no other keyword
+    are searched, and keywords with the same words are searched once.
+    With 'combine' above 1, up to that many phrases are OR-ed into one query.
+    Each query lists the keywords whose posts it returns and the NGOs its posts always belong to;
+    attribute_posts assigns the remaining NGOs by matching the post text locally.
+    A query stands in for the searches of all the keywords it covers, so its 'max_results_factor'
+    is their number: the NGOs of covered keywords keep the share of posts their own search had.
     """
-    if not ngo_content_data:
-        print("No NGO-content mappings found; ngo_content CSV not created.")
-        return
-    df = pd.DataFrame(ngo_content_data)
-    df = df[['ngo_id', 'external_content_id']].drop_duplicates()
-    df.to_csv(filename, index=False, encoding='utf-8-sig')
-    print(f"NGO-content mapping data saved to {filename}")
-
-def save_comments_to_csv(comments_data, filename="comments.csv"):
-    """
-    Save comments data to 'comments.csv'.
-    Since BlueSky does not currently provide comments data in this example, this may remain empty.
-    """
-    if not comments_data:
-        print("No comments data collected; creating an empty comments CSV.")
-        df = pd.DataFrame(columns=[
-            'comment_id', 'post_external_id', 'author', 'body',
-            'created_at', 'like_count', 'reply_count', 'parent_id', 'metadata'
-        ])
-    else:
-        df = pd.DataFrame(comments_data)
-    df.to_csv(filename, index=False, encoding='utf-8-sig')
-    print(f"Comments data saved to {filename}")
+    matcher = get_matcher(ngos_list, acronym_ignore_case=True)
+
+    phrases = {}
+    for ngo in ngos_list:
+        for kw in ngo.get('keywords', []):
+            tokens = keyword_tokens(kw)
+            if tokens:
+                phrases.setdefault(tokens, kw)
+
+    roots = [tokens for tokens in phrases
+             if not any(other != tokens and contains_phrase(tokens, other) for other in phrases)]
+
+    groups = []
+    for tokens in roots:
+        keywords = [kw for kw in matcher.keyword_to_ngos if contains_phrase(keyword_tokens(kw), tokens)]
+        ngo_ids = set()
+        for kw in keywords:
+            if keyword_tokens(kw) == tokens:
+                ngo_ids.update(matcher.keyword_to_ngos[kw])
+        # One search per distinct keyword is replaced, as keyword_queries would run them
+        factor = max(1, len({keyword_tokens(kw) for kw in keywords}))
+        groups.append((phrases[tokens], keywords, ngo_ids, factor))
+
+    queries = []
+    combine = max(1, combine)
+    for start in range(0, len(groups), combine):
+        batch = groups[start:start + combine]
+        if len(batch) == 1:
+            phrase, keywords, ngo_ids, factor = batch[0]
+            queries.append({'query': phrase, 'phrases': [phrase], 'keywords': keywords,
+                            'ngo_ids': ngo_ids, 'max_results_factor': factor})
+        else:
+            # Posts of a combined query may match any of its phrases, so none of its NGOs is certain.
+            queries.append({
+                'query': " OR ".join(f'"{phrase}"' for phrase, _, _, _ in batch),
+                'phrases': [phrase for phrase, _, _, _ in batch],
+                'keywords': [kw for _, keywords, _, _ in batch for kw in keywords],
+                'ngo_ids': set(),
+                'max_results_factor': sum(factor for _, _, _, factor in batch)
+            })
+    return queries
+
+def attribute_posts(query, posts, matcher):
+    """
+    Return the NGO-content mappings for the posts returned by a query: the query's own NGOs,
+    plus the NGOs of its covered keywords that the shared keyword matcher finds in each post.
+    """
+    keywords = set(query['keywords'])
+    ngo_content = []
+    for post in posts:
+        ngo_ids = set(query['ngo_ids'])
+        if keywords:
+            for kw in matcher.match_keywords(post['description']) & keywords:
+                ngo_ids.update(matcher.keyword_to_ngos[kw])
+        for ngo_id in sorted(ngo_ids):
+            ngo_content.append({
+                'ngo_id': ngo_id,
+                'external_content_id': post['external_content_id']
+            })
+    return ngo_content
+
+async def sweep_ngo_keywords(queries, max_results, sort_method, target_date=None, date_range=None,
+                             concurrency=DEFAULT_CONCURRENCY, client=None, shard=None, marks=None, on_result=None):
+    """
+    Run every search query concurrently, at most 'concurrency' searches at a time.
+    The client's rate limit applies across all searches, including their date window slices.
+    'marks' optionally maps query strings to the published_at mark of a previous incremental run.
+    With 'on_result', calls on_result(query, posts) as each search finishes, so that results
+    can be saved without holding the whole sweep in memory, and returns nothing.
+    Otherwise returns a list of (query, posts) pairs in the order of the queries.
+    """
+    marks = marks or {}
+    client = client or get_bluesky_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def search(query):
+            limit = max_results * query['max_results_factor']
+            async with semaphore:
+                posts = await loop.run_in_executor(
+                    executor,
+                    lambda: search_keyword(query['query'], limit, sort_method, target_date, date_range, shard, client,
+                                           newer_than=marks.get(query['query']))
+                )
+            return query, posts
+
+        if on_result is None:
+            return await asyncio.gather(*(search(query) for query in queries))
+        for result in asyncio.as_completed([search(query) for query in queries]):
+            on_result(*await result)
+
+def write_posts(sinks, posts, ngo_content):
+    """
+    Write a batch of posts and their NGO-content mappings to the output sinks.
+    Posts with invalid or missing published_at dates are filtered out.
+    Returns the number of posts filtered out.
+    """
+    valid = valid_dates(pd.Series([post['published_at'] for post in posts], dtype=object))
+    sinks.content.write_many(post for post, is_valid in zip(posts, valid) if is_valid)
+    sinks.ngo_content.write_many(ngo_content)
+    return len(posts) - int(valid.sum())
 
 def main():
+    global bluesky_client
+
     parser = setup_parser()
     args = parser.parse_args()
+    bluesky_client = BlueskyClient(timeout=args.timeout, max_retries=args.max_retries,
+                                   pool_size=max(DEFAULT_POOL_SIZE, args.concurrency),
+                                   requests_per_second=args.requests_per_second,
+                                   cache=cache_from_args(args))
+    state = state_from_args(args)
 
-    all_posts = []
-    all_ngo_content = []
-    all_comments = []  # BlueSky comments are not scraped in this example; will remain empty.
-
-    # If a keyword is provided via command line, use that and try to identify the related NGO.
-    if args.keyword:
-        kw = args.keyword[0]
-        posts = scrape_posts(kw, args.max_results, args.sort_method, 
-                             args.target_date[0] if args.target_date else None,
-                             args.date_range)
-        if posts:
-            all_posts.extend(posts)
-            # For mapping, check each NGO to see if this keyword is among its keywords.
-            for ngo in ngos_list:
-                if kw in ngo.get('keywords', []):
-                    for post in posts:
-                        all_ngo_content.append({
-                            'ngo_id': ngo['ngo_id'],
-                            'external_content_id': post['external_content_id']
-                        })
-    else:
-        # If no specific keyword provided, iterate over all NGOs in the list.
-        print("No keyword provided; iterating over all NGOs and their keywords.")
-        for ngo in ngos_list:
-            for kw in ngo.get('keywords', []):
-                posts = scrape_posts(kw, args.max_results, args.sort_method, 
-                                     args.target_date[0] if args.target_date else None,
-                                     args.date_range)
-                if posts:
-                    all_posts.extend(posts)
-                    for post in posts:
-                        all_ngo_content.append({
-                            'ngo_id': ngo['ngo_id'],
-                            'external_content_id': post['external_content_id']
-                        })
-    
-    # Save the collected data into CSV files.
-    save_content_to_csv(all_posts, "content.csv")
-    save_ngo_content_to_csv(all_ngo_content, "ngo_content.csv")
-    save_comments_to_csv(all_comments, "comments.csv")
+    # Records are written out as each search finishes; only the URIs of posts with replies are kept.
+    # Incremental runs add their delta to the existing output instead of replacing it.
+    reply_post_uris = []
+    invalid_count = 0
+
+    with sinks_from_args(args, append=bool(state)) as sinks:
+        def save_posts(posts, ngo_content):
+            nonlocal invalid_count
+            invalid_count += write_posts(sinks, posts, ngo_content)
+            reply_post_uris.extend(post['external_content_id'] for post in posts if post.get('comment_count', 0) > 0)
+
+        # If a keyword is provided via command line, use that and try to identify the related NGO.
+        if args.keyword:
+            kw = args.keyword[0]
+            posts = search_keyword(kw, args.max_results, args.sort_method,
+                                   args.target_date[0] if args.target_date else None,
+                                   args.date_range, args.shard,
+                                   newer_than=state.get_mark('bluesky', kw) if state else None)
+            if state:
+                # Posts up to the cap may stop short of the previous mark
+                state.update_mark('bluesky', kw, posts, complete=len(posts) < args.max_results)
+            # For mapping, look up the NGOs that list this keyword among their keywords.
+            save_posts(posts, [
+                {'ngo_id': ngo_id, 'external_content_id': post['external_content_id']}
+                for ngo_id in get_matcher(ngos_list).ngos_for_keyword(kw) for post in posts
+            ])
+        else:
+            # If no specific keyword provided, search all keywords of all NGOs concurrently.
+            print("No keyword provided; searching all NGOs and their keywords.")
+            if args.plan_queries:
+                queries = plan_keyword_queries(ngos_list, args.combine_queries)
+                print(f"Planned {len(queries)} queries covering "
+                      f"{sum(len(ngo.get('keywords', [])) for ngo in ngos_list)} NGO keywords.")
+            else:
+                queries = keyword_queries(ngos_list)
+            marks = {query['query']: state.get_mark('bluesky', query['query']) for query in queries} if state else None
+            matcher = get_matcher(ngos_list, acronym_ignore_case=True)
+
+            def on_result(query, posts):
+                if state:
+                    # Posts up to the cap may stop short of the previous mark
+                    state.update_mark('bluesky', query['query'], posts,
+                                      complete=len(posts) < args.max_results * query['max_results_factor'])
+                save_posts(posts, attribute_posts(query, posts, matcher))
+
+            asyncio.run(sweep_ngo_keywords(queries, args.max_results, args.sort_method,
+                                           args.target_date[0] if args.target_date else None,
+                                           args.date_range, concurrency=args.concurrency,
+                                           shard=args.shard, marks=marks, on_result=on_result))
+        if invalid_count:
+            print(f"Warning: {invalid_count} posts with invalid or missing dates were filtered out.")
+
+        # Fetch the reply threads of posts that have replies.
+        if not args.skip_comments:
+            for replies in scrape_comments(reply_post_uris, args.max_comment_depth, args.max_comments,
+                                           concurrency=args.concurrency):
+                sinks.comments.write_many(replies)
+
+    # Record the new marks only once the delta is saved.
+    if state:
+        state.save()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,259 @@
+# ngo_matcher.py
+
+import re
+import math
+from collections import Counter, defaultdict
+from thefuzz import fuzz, process
+from thefuzz.utils import full_process
+
+from ngos_list import ngos_list as default_ngos_list
+
+
+def _trie_pattern(words):
+    """
+    Build a regex alternation for the given words, nested as a trie so that
+    every position of the text only explores the branches sharing its prefix.
+    Returns None if no words are provided.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A word ends here, so the longer continuations are optional.
+            body = '(?:' + body + ')?'
+        return body
+
+    if not trie:
+        return None
+    return emit(trie)
+
+
+class TrigramIndex:
+    """
+    Inverted index from character trigrams to the strings containing them.
+    Shortlists the strings that could reach a fuzz.partial_ratio score against a text,
+    so only those need to be scored.
+    """
+
+    def __init__(self, strings):
+        self.strings = list(strings)
+        self.postings = defaultdict(list)
+        for idx, string in enumerate(self.strings):
+            for trigram, count in Counter(string[i:i + 3] for i in range(len(string) - 2)).items():
+                self.postings[trigram].append((idx, count))
+
+    def min_shared_trigrams(self, length, score_cutoff):
+        """
+        Return how many trigram positions of a string of the given length must also occur
+        in the text for fuzz.partial_ratio to reach score_cutoff.
+        partial_ratio aligns the string with windows of at most its own length, so reaching
+        the cutoff allows at most 2 * (1 - score_cutoff / 100) * length insertions and deletions,
+        and each edit destroys at most 3 trigrams (q-gram lemma).
+        """
+        max_edits = math.floor(2 * (1 - score_cutoff / 100) * length + 1e-9)
+        return length - 2 - 3 * max_edits
+
+    def candidates(self, text, score_cutoff):
+        """
+        Return the indices, in insertion order, of the strings that may score at least
+        score_cutoff with fuzz.partial_ratio against the text. No other string can.
+        The bound holds for texts of any length: the trigrams a string shares with its best
+        aligned window are also found in the whole text.
+        """
+        shared = [0] * len(self.strings)
+        text_trigrams = {text[i:i + 3] for i in range(len(text) - 2)}
+        for trigram in text_trigrams & self.postings.keys():
+            for idx, count in self.postings[trigram]:
+                shared[idx] += count
+
+        candidates = []
+        for idx, string in enumerate(self.strings):
+            # A text no longer than the string is aligned inside the string instead, so it is always scored.
+            if len(text) <= len(string) or shared[idx] >= self.min_shared_trigrams(len(string), score_cutoff):
+                candidates.append(idx)
+        return candidates
+
+
+class NGOMatcher:
+    """
+    Find every NGO keyword mentioned in a text in a single pass.
+    Acronym keywords (all upper case) only match as complete words; all other
+    keywords match as case-insensitive substrings.
+    Set 'acronym_ignore_case' to also match acronyms regardless of case.
+    """
+
+    def __init__(self, ngos_list, acronym_ignore_case=False):
+        self.ngos_list = ngos_list
+        self.acronym_ignore_case = acronym_ignore_case
+
+        # Map every keyword to all NGOs listing it (a few keywords are shared).
+        self.keyword_to_ngos = defaultdict(set)
+        for ngo in ngos_list:
+            for keyword in ngo['keywords']:
+                self.keyword_to_ngos[keyword].add(ngo['ngo_id'])
+
+        self.acronym_keywords = [keyword for keyword in self.keyword_to_ngos if keyword.isupper()]
+        self.substring_keywords = [keyword for keyword in self.keyword_to_ngos if not keyword.isupper()]
+
+        # Substring keywords are matched against the lower-cased text.
+        self._substring_lookup = defaultdict(set)
+        for keyword in self.substring_keywords:
+            self._substring_lookup[keyword.lower()].add(keyword)
+
+        # The scan only reports the longest keyword starting at each position,
+        # so every keyword also stands in for the shorter keywords it starts with.
+        self._substring_closure = {
+            key: {keyword for prefix in self._substring_lookup if key.startswith(prefix)
+                  for keyword in self._substring_lookup[prefix]}
+            for key in self._substring_lookup
+        }
+        pattern = _trie_pattern(self._substring_lookup)
+        self._substring_regex = re.compile(f"(?=({pattern}))") if pattern else None
+
+        flags = re.IGNORECASE if acronym_ignore_case else 0
+        self._acronym_lookup = defaultdict(set)
+        for keyword in self.acronym_keywords:
+            self._acronym_lookup[self._acronym_key(keyword)].add(keyword)
+
+        # Shorter acronyms sharing a start position need their own trailing word boundary check.
+        self._acronym_prefixes = {
+            key: [(prefix, re.compile(re.escape(prefix) + r"\b", flags))
+                  for prefix in self._acronym_lookup if prefix != key and key.startswith(prefix)]
+            for key in self._acronym_lookup
+        }
+        pattern = _trie_pattern(self.acronym_keywords)
+        self._acronym_regex = re.compile(rf"\b(?=({pattern})\b)", flags) if pattern else None
+
+        # Fuzzy matching compares the lower-cased non-acronym keywords with the lower-cased text.
+        self._keyword_index = TrigramIndex(self._substring_lookup)
+
+        # Fuzzy matching of whole texts compares against the non-acronym NGO names,
+        # both cleaned by thefuzz's default processor.
+        self._name_to_ngo = {}
+        for ngo in ngos_list:
+            if not ngo['name'].isupper():
+                self._name_to_ngo.setdefault(ngo['name'], ngo['ngo_id'])
+        self._fuzzy_names = list(self._name_to_ngo)
+        self._name_index = TrigramIndex(full_process(name) for name in self._fuzzy_names)
+
+    def _acronym_key(self, keyword):
+        return keyword.lower() if self.acronym_ignore_case else keyword
+
+    def match_keywords(self, text):
+        """
+        Return the set of keywords mentioned in the text.
+        """
+        keywords_found = set()
+        if not text:
+            return keywords_found
+
+        if self._substring_regex:
+            for match in self._substring_regex.finditer(text.lower()):
+                keywords_found.update(self._substring_closure[match.group(1)])
+
+        if self._acronym_regex:
+            for match in self._acronym_regex.finditer(text):
+                key = self._acronym_key(match.group(1))
+                keywords_found.update(self._acronym_lookup[key])
+                for prefix, prefix_regex in self._acronym_prefixes[key]:
+                    if prefix_regex.match(text, match.start()):
+                        keywords_found.update(self._acronym_lookup[prefix])
+
+        return keywords_found
+
+    def match_ngos(self, text):
+        """
+        Return the set of NGO IDs whose keywords are mentioned in the text.
+        """
+        ngos_found = set()
+        for keyword in self.match_keywords(text):
+            ngos_found.update(self.keyword_to_ngos[keyword])
+        return ngos_found
+
+    def fuzzy_match_keywords(self, text, fuzzy_threshold=90):
+        """
+        Return the set of non-acronym keywords whose fuzz.partial_ratio against the
+        lower-cased text is at least fuzzy_threshold.
+        """
+        text_lower = text.lower()
+        score_cutoff = max(0, fuzzy_threshold - 0.5)  # partial_ratio scores are rounded
+        index = self._keyword_index
+        shortlist = {idx: index.strings[idx] for idx in index.candidates(text_lower, score_cutoff)}
+        matches = process.extractBests(text_lower, shortlist, processor=None, scorer=fuzz.partial_ratio,
+                                       score_cutoff=score_cutoff, limit=None)
+
+        keywords_found = set()
+        for _, _, idx in matches:
+            keywords_found.update(self._substring_lookup[index.strings[idx]])
+        return keywords_found
+
+    def fuzzy_match_name(self, text, fuzzy_threshold=90):
+        """
+        Return the ID of the non-acronym NGO whose name best matches the text with
+        fuzz.partial_ratio, or None if the best score is below fuzzy_threshold.
+        Same result as process.extractOne over all non-acronym NGO names.
+        """
+        query = full_process(text)
+        if not query:
+            return None
+
+        score_cutoff = max(0, fuzzy_threshold - 0.5)  # partial_ratio scores are rounded
+        index = self._name_index
+        shortlist = {idx: index.strings[idx] for idx in index.candidates(query, score_cutoff)}
+        best_match = process.extractOne(query, shortlist, processor=None, scorer=fuzz.partial_ratio,
+                                        score_cutoff=score_cutoff)
+        if not best_match:
+            return None
+        return self._name_to_ngo[self._fuzzy_names[best_match[2]]]
+
+    def match_ngos_with_fuzzy_keywords(self, text, fuzzy_threshold=90):
+        """
+        Return the set of NGO IDs mentioned in the text, adding the NGOs of every
+        non-acronym keyword that passes fuzzy matching (YouTube scraper rules).
+        """
+        keywords_found = self.match_keywords(text) | self.fuzzy_match_keywords(text, fuzzy_threshold)
+        ngos_found = set()
+        for keyword in keywords_found:
+            ngos_found.update(self.keyword_to_ngos[keyword])
+        return ngos_found
+
+    def match_ngos_with_fuzzy_name(self, text, fuzzy_threshold=90):
+        """
+        Return the set of NGO IDs mentioned in the text, falling back to the best
+        fuzzy NGO name match if no keyword is found (Reddit scraper rules).
+        """
+        ngos_found = self.match_ngos(text)
+        if not ngos_found:
+            ngo_id = self.fuzzy_match_name(text, fuzzy_threshold)
+            if ngo_id:
+                ngos_found.add(ngo_id)
+        return ngos_found
+
+    def ngos_for_keyword(self, keyword):
+        """
+        Return the set of NGO IDs listing the given keyword.
+        """
+        return set(self.keyword_to_ngos.get(keyword, ()))
+
+
+_matchers = {}
+
+def get_matcher(ngos_list=default_ngos_list, acronym_ignore_case=False):
+    """
+    Return a matcher for the given NGO list, building it only on first use.
+    """
+    key = (id(ngos_list), acronym_ignore_case)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = NGOMatcher(ngos_list, acronym_ignore_case=acronym_ignore_case)
+        _matchers[key] = matcher
+    return matcher
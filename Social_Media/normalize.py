@@ -0,0 +1,43 @@
+# normalize.py
+
+import pandas as pd
+
+# Define the date format of the unified schema's 'published_at' and 'created_at' fields (UTC)
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def format_timestamps(values, unit=None):
+    """
+    Convert a batch of raw timestamps to the unified date format in one vectorized pass.
+    Pass unit='s' for epoch seconds; otherwise values are ISO 8601 strings, whose time zone
+    offsets are converted to UTC and whose fractional seconds may have any number of digits.
+    Missing or unparseable values become empty strings.
+    """
+    series = pd.Series(list(values), dtype=object)
+    if series.empty:
+        return []
+    if unit:
+        parsed = pd.to_datetime(pd.to_numeric(series, errors='coerce'), unit=unit, errors='coerce')
+    else:
+        # Nanosecond precision at most: drop any fractional digits beyond 9
+        series = series.where(series.map(lambda value: isinstance(value, str)))
+        series = series.str.replace(r"(\.\d{9})\d+", r"\1", regex=True)
+        parsed = pd.to_datetime(series, utc=True, errors='coerce', format='ISO8601')
+    return parsed.dt.strftime(DATE_FORMAT).fillna('').tolist()
+
+
+def normalize_timestamps(records, field, unit=None):
+    """
+    Replace the raw timestamps in 'field' of a batch of records with unified dates, in place.
+    Returns the records.
+    """
+    for record, formatted in zip(records, format_timestamps((record.get(field) for record in records), unit)):
+        record[field] = formatted
+    return records
+
+
+def valid_dates(dates):
+    """
+    Return a boolean mask of the unified dates in a Series that are present and valid.
+    """
+    return dates.fillna('').astype(str).ne('') & dates.ne('0000-00-00 00:00:00')
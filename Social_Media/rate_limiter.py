@@ -0,0 +1,87 @@
+# rate_limiter.py
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing calls evenly so that at most
+    'requests_per_second' calls go out per second across all threads.
+    A value of 0 or None disables the limit.
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """
+        Block until the next call is allowed.
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_time)
+            self._next_time = scheduled + self.interval
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+
+class HeaderRateLimiter:
+    """
+    Thread-safe request budget driven by the API's rate limit response headers
+    ('x-ratelimit-remaining' and 'x-ratelimit-reset', in seconds).
+    Requests go out as long as the last reported budget, minus the requests still in
+    flight, is not used up; then every caller waits for the reset. Until a budget is
+    known, only one request is in flight at a time.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.remaining = None
+        self.reset_time = 0.0
+        self.in_flight = 0
+
+    def acquire(self):
+        """
+        Block until a request may be sent, and count it as in flight.
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.remaining is None:
+                    if self.in_flight == 0:
+                        break
+                elif self.remaining - self.in_flight > 0:
+                    break
+                elif now >= self.reset_time and self.in_flight == 0:
+                    self.remaining = None  # The window was reset; probe for the new budget
+                    continue
+                self._condition.wait(max(0.05, self.reset_time - now) if self.remaining is not None else None)
+            self.in_flight += 1
+
+    def release(self, headers=None):
+        """
+        Count an in-flight request as done, updating the budget from its response headers.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if headers and 'x-ratelimit-remaining' in headers:
+                try:
+                    remaining = int(float(headers['x-ratelimit-remaining']))
+                    reset_time = time.monotonic() + float(headers.get('x-ratelimit-reset', 0))
+                except ValueError:
+                    remaining = None
+                if remaining is not None:
+                    if self.remaining is not None and reset_time <= self.reset_time + 1:
+                        # Same window: responses may arrive out of order, so keep the lowest budget
+                        self.remaining = min(self.remaining, remaining)
+                    else:
+                        self.remaining = remaining
+                        self.reset_time = reset_time
+            elif self.remaining is not None:
+                self.remaining -= 1
+            self._condition.notify_all()
@@ -1,14 +1,20 @@
 # reddit/reddit_scraper.py
 
-import re
 import praw
+import prawcore
+import requests
 import pandas as pd
 from dotenv import load_dotenv
 import os
 import argparse
 import sys
-from thefuzz import fuzz, process
 import json
+import threading
+import time
+import heapq
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 # Set a constant for Reddit platform_id.
 PLATFORM_ID = 1
@@ -22,6 +28,40 @@ MAX_COMMENTS_PER_DEPTH = 3
 # Define a global constant for the maximum depth of comments replies to scrape per post
 MAX_DEPTH_PER_POST = 2
 
+# Define the default number of subreddits scraped concurrently (1 scrapes them one after another)
+DEFAULT_SUBREDDIT_WORKERS = 1
+
+# Define the default number of threads fetching the comments of matched posts
+DEFAULT_COMMENT_WORKERS = 4
+
+# Define the default number of subreddits listed together through one multireddit (1 lists each on its own)
+DEFAULT_SUBREDDIT_BATCH_SIZE = 1
+
+# Reddit serves at most about 1000 items of any listing, so a multireddit batch holds at most
+# as many subreddits as fit in one listing with MAX_POSTS_PER_SUBREDDIT posts each
+REDDIT_LISTING_LIMIT = 1000
+MAX_SUBREDDIT_BATCH_SIZE = max(1, REDDIT_LISTING_LIMIT // MAX_POSTS_PER_SUBREDDIT)
+
+# Define the listing time filters, from the narrowest, with the age in seconds of the oldest posts they cover
+SECONDS_PER_DAY = 24 * 3600
+TIME_FILTERS = [
+    ("hour", 3600),
+    ("day", SECONDS_PER_DAY),
+    ("week", 7 * SECONDS_PER_DAY),
+    ("month", 30 * SECONDS_PER_DAY),
+    ("year", 365 * SECONDS_PER_DAY)
+]
+
+# Define how often stream mode writes out the matched posts, in seconds
+STREAM_FLUSH_INTERVAL = 60
+
+# Define the backoff of stream mode after a Reddit API error, in seconds, doubled after each failed attempt
+STREAM_RETRY_DELAY = 5
+STREAM_MAX_BACKOFF = 300
+
+# Define the time filters whose posts are few enough to read from the newest listing instead of the top listing
+NEW_LISTING_TIME_FILTERS = ("hour", "day", "week")
+
 # Define a global list of relevant subreddits to iterate through if no CLI args are provided
 DEFAULT_SUBREDDITS = [
     "nonprofit",
@@ -50,6 +90,66 @@ DEFAULT_SUBREDDITS = [
 ]
 
 from ngos_list import ngos_list
+from ngo_matcher import get_matcher
+from rate_limiter import HeaderRateLimiter
+from response_cache import add_cache_arguments, cache_from_args
+from scrape_state import add_state_arguments, state_from_args
+from normalize import format_timestamps, normalize_timestamps
+from sinks import add_sink_arguments, sinks_from_args
+
+class RedditRequestor(prawcore.Requestor):
+    """
+    PRAW requestor shared by the scraper's Reddit clients.
+    Successful GET responses are served from a ResponseCache when 'cache' is given:
+    listings and comment pages are keyed by URL path and query parameters, while
+    authentication and other non-GET requests always go to Reddit.
+    Requests sent to Reddit wait for the HeaderRateLimiter given as 'rate_limiter',
+    so that clients working in parallel share one rate limit budget.
+    """
+
+    def __init__(self, *args, cache=None, rate_limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+
+    def send(self, *args, timeout=None, **kwargs):
+        """
+        Send a request to Reddit within the shared rate limit budget.
+        """
+        if self.rate_limiter is None:
+            return super().request(*args, timeout=timeout, **kwargs)
+        response = None
+        self.rate_limiter.acquire()
+        try:
+            response = super().request(*args, timeout=timeout, **kwargs)
+            return response
+        finally:
+            self.rate_limiter.release(response.headers if response is not None else None)
+
+    def request(self, *args, timeout=None, **kwargs):
+        method = kwargs.get('method', args[0] if args else None)
+        url = kwargs.get('url', args[1] if len(args) > 1 else None)
+        if self.cache is None or str(method).upper() != 'GET':
+            return self.send(*args, timeout=timeout, **kwargs)
+
+        path = urlsplit(url).path
+        endpoint = 'reddit.comments' if '/comments/' in path else 'reddit.listing'
+        params = [path, sorted((str(name), str(value)) for name, value in (kwargs.get('params') or {}).items())]
+
+        cached = self.cache.get(endpoint, params)
+        if cached is not None:
+            response = requests.Response()
+            response.status_code = 200
+            response._content = cached['body'].encode('utf-8')
+            response.headers['content-type'] = 'application/json; charset=UTF-8'
+            response.encoding = 'utf-8'
+            response.url = url
+            return response
+
+        response = self.send(*args, timeout=timeout, **kwargs)
+        if response.status_code == 200:
+            self.cache.set(endpoint, params, {'body': response.text})
+        return response
 
 def load_credentials():
     """
@@ -65,19 +165,216 @@ def load_credentials():
     
     return client_id, client_secret, user_agent
 
-def initialize_reddit_client(client_id, client_secret, user_agent):
+def initialize_reddit_client(client_id, client_secret, user_agent, cache=None, rate_limiter=None):
     """
     Initialize the Reddit API client using PRAW.
+    Pass a ResponseCache as 'cache' to serve repeated requests from disk, and a
+    HeaderRateLimiter as 'rate_limiter' to share one rate limit budget between clients.
     """
     reddit = praw.Reddit(client_id=client_id,
                          client_secret=client_secret,
-                         user_agent=user_agent)
+                         user_agent=user_agent,
+                         requestor_class=RedditRequestor,
+                         requestor_kwargs={'cache': cache, 'rate_limiter': rate_limiter})
     return reddit
 
-def scrape_subreddit_posts(reddit, subreddit_name, ngos_list, fuzzy_threshold=90, target_date=None, date_range=3):
+def get_subreddit_batches(subreddits, batch_size=DEFAULT_SUBREDDIT_BATCH_SIZE):
+    """
+    Split the subreddits into consecutive groups of at most 'batch_size' names,
+    and never more than MAX_SUBREDDIT_BATCH_SIZE.
+    """
+    batch_size = min(max(1, batch_size), MAX_SUBREDDIT_BATCH_SIZE)
+    return [subreddits[start:start + batch_size] for start in range(0, len(subreddits), batch_size)]
+
+def scrape_subreddits(reddit, subreddits, ngos_list, batch_size=DEFAULT_SUBREDDIT_BATCH_SIZE, **kwargs):
+    """
+    Scrape the subreddits one after another, or group by group through multireddits if 'batch_size' is above 1.
+    Yields the results of scrape_subreddit_posts in the order of 'subreddits', as each subreddit is done.
+    """
+    for batch in get_subreddit_batches(subreddits, batch_size):
+        if len(batch) > 1:
+            print(f"Starting to scrape subreddits: {', '.join(batch)}")
+            yield from scrape_subreddit_batch(reddit, batch, ngos_list, **kwargs)
+        else:
+            print(f"Starting to scrape subreddit: {batch[0]}")
+            yield scrape_subreddit_posts(reddit, batch[0], ngos_list, **kwargs)
+
+def scrape_subreddits_in_parallel(subreddits, client_factory, ngos_list, max_workers,
+                                  batch_size=DEFAULT_SUBREDDIT_BATCH_SIZE, **kwargs):
+    """
+    Scrape several subreddits (or multireddit batches of them) concurrently, each worker
+    thread using its own PRAW client from 'client_factory' since PRAW clients are not thread-safe.
+    Clients sharing one HeaderRateLimiter use up Reddit's rate limit budget but never exceed it.
+    Yields the results of scrape_subreddit_posts in the order of 'subreddits', as each batch is done,
+    so merging them gives the same output as scraping one subreddit after another.
+    """
+    thread_local = threading.local()
+
+    def scrape(batch):
+        if not hasattr(thread_local, 'reddit'):
+            thread_local.reddit = client_factory()
+        return list(scrape_subreddits(thread_local.reddit, batch, ngos_list, batch_size, **kwargs))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch_results in executor.map(scrape, get_subreddit_batches(subreddits, batch_size)):
+            yield from batch_results
+
+def get_date_window(target_date, date_range):
+    """
+    Return the (start, end) epoch seconds bounding the posts kept around a 'YYYY-MM-DD' target date:
+    from date_range days before it up to, but excluding, date_range + 1 days after it.
+    Returns None if no target date is given.
+    """
+    if not target_date:
+        return None
+    target_epoch = int(pd.Timestamp(target_date).timestamp())
+    return target_epoch - date_range * SECONDS_PER_DAY, target_epoch + (date_range + 1) * SECONDS_PER_DAY
+
+def get_time_filter(start_epoch, now=None):
+    """
+    Return the narrowest listing time filter still covering posts created at 'start_epoch'.
+    """
+    age = (now or time.time()) - start_epoch
+    for time_filter, seconds in TIME_FILTERS:
+        if age <= seconds:
+            return time_filter
+    return "all"
+
+def list_submissions(subreddit, limit=MAX_POSTS_PER_SUBREDDIT, window=None, newer_than=None):
+    """
+    Yield up to 'limit' submissions of a subreddit listing.
+    Without bounds this is the all-time top listing. With a (start, end) epoch 'window',
+    recent windows are read from the newest listing, stopping once posts are older than the
+    window, and older windows from the top listing of the narrowest covering time filter.
+    With a 'newer_than' epoch the newest listing is read down to that time.
+    """
+    if not window and newer_than is None:
+        yield from subreddit.top(limit=limit)
+        return
+
+    start, end = window or (newer_than, None)
+    if newer_than is not None:
+        start = max(start, newer_than + 1)
+
+    if newer_than is not None or get_time_filter(start) in NEW_LISTING_TIME_FILTERS:
+        found = 0
+        for submission in subreddit.new(limit=None):
+            if submission.created_utc < start:
+                break  # Newest first, so every remaining post is older
+            if end is not None and submission.created_utc >= end:
+                continue
+            yield submission
+            found += 1
+            if found >= limit:
+                break
+    else:
+        for submission in subreddit.top(time_filter=get_time_filter(start), limit=limit):
+            if start <= submission.created_utc < end:
+                yield submission
+
+def submission_to_record(submission):
+    """
+    Convert a submission to a record following the unified content schema.
+    'published_at' holds the raw created_utc epoch until normalize_timestamps formats the batch.
+    """
+    author = submission.author.name if submission.author else None
+
+    # Attempt to retrieve 'ups'; fallback to 'score' if 'ups' is unavailable
+    like_count = submission.ups if hasattr(submission, 'ups') else submission.score
+
+    return {
+        'external_content_id': submission.id,
+        'platform_id': PLATFORM_ID,
+        'title': submission.title,
+        'description': submission.selftext,
+        'url': submission.url,
+        'author': author,
+        'published_at': submission.created_utc,
+        'view_count': submission.score,
+        'like_count': like_count,
+        'comment_count': submission.num_comments,
+        'content_type': 'Post',
+        'metadata': json.dumps({
+            'url': submission.url,
+            'author': author
+        })
+    }
+
+def get_newer_than(state, subreddit_name):
+    """
+    Return the incremental mark of a subreddit as epoch seconds: None without a scrape state,
+    and 0 on its first incremental run, so that the newest listing is read from the start.
+    """
+    if not state:
+        return None
+    mark = state.get_mark('reddit', subreddit_name)
+    return int(pd.Timestamp(mark).timestamp()) if mark else 0
+
+def scrape_subreddit_batch(reddit, subreddit_names, ngos_list, fuzzy_threshold=90, target_date=None, date_range=3,
+                           state=None, comment_queue=None):
+    """
+    Scrape a group of subreddits through a single multireddit listing ('a+b+c'), so that small
+    subreddits do not cost a full set of listing requests each.
+    The listing is split locally by each submission's subreddit, keeping at most
+    MAX_POSTS_PER_SUBREDDIT posts per subreddit and each subreddit's own incremental mark.
+    Note that a multireddit's listing ranks posts across the group, so busy subreddits
+    can fill it before small ones reach their quota. When the listing is used up to its
+    limit (or fails), every subreddit still under MAX_POSTS_PER_SUBREDDIT is listed again
+    on its own, at the cost of the requests batching was meant to save.
+    Returns the results of scrape_subreddit_posts in the order of 'subreddit_names'.
+    """
+    window = get_date_window(target_date, date_range)
+    marks = {name.lower(): get_newer_than(state, name) for name in subreddit_names}
+    newer_than = min(marks.values()) if state else None
+
+    submissions_by_subreddit = {name.lower(): [] for name in subreddit_names}
+    open_subreddits = set(submissions_by_subreddit)
+    multireddit = reddit.subreddit("+".join(subreddit_names))
+    limit = MAX_POSTS_PER_SUBREDDIT * len(subreddit_names)
+    listed = 0
+    try:
+        for submission in list_submissions(multireddit, limit, window, newer_than):
+            listed += 1
+            key = submission.subreddit.display_name.lower()
+            if key not in open_subreddits:
+                continue
+            if marks[key] is not None and submission.created_utc <= marks[key]:
+                continue  # Seen by a previous run of this subreddit
+            submissions_by_subreddit[key].append(submission)
+            if len(submissions_by_subreddit[key]) >= MAX_POSTS_PER_SUBREDDIT:
+                open_subreddits.discard(key)
+                if not open_subreddits:
+                    break
+    except Exception as e:
+        print(f"Error accessing subreddits '{'+'.join(subreddit_names)}': {e}")
+        listed = limit
+
+    # A listing that ran dry before its limit covered every subreddit; otherwise the ones under
+    # their quota may have been crowded out, so they are listed on their own.
+    crowded_out = set(open_subreddits) if listed >= limit else set()
+    if crowded_out:
+        print(f"Multireddit listing reached its limit; listing {', '.join(sorted(crowded_out))} on their own.")
+
+    for key in crowded_out:
+        submissions_by_subreddit[key] = None
+
+    return [
+        scrape_subreddit_posts(reddit, name, ngos_list, fuzzy_threshold, target_date, date_range, state,
+                               submissions=submissions_by_subreddit[name.lower()], comment_queue=comment_queue)
+        for name in subreddit_names
+    ]
+
+def scrape_subreddit_posts(reddit, subreddit_name, ngos_list, fuzzy_threshold=90, target_date=None, date_range=3,
+                           state=None, submissions=None, comment_queue=None):
     """
     Scrape the top posts from a specified subreddit and identify associated NGOs using exact and fuzzy matching.
     Only posts matched to at least one NGO are saved.
+    With a target date, only the posts within date_range days of it are listed (see list_submissions).
+    With an incremental scrape 'state', the newest posts are read instead, stopping at the
+    first post seen by a previous run, and the subreddit's mark is advanced.
+    Pass already listed 'submissions' to process them instead of listing the subreddit.
+    Pass a CommentQueue as 'comment_queue' to defer fetching the comments of matched posts to it;
+    the returned comments are then empty.
     """
     subreddit = reddit.subreddit(subreddit_name)
     posts_data = []
@@ -85,178 +382,274 @@ def scrape_subreddit_posts(reddit, subreddit_name, ngos_list, fuzzy_threshold=90
     ngo_content_data = []
     ngos_found = set()
     
-    # List of all NGO names for fuzzy matching
-    ngo_names = [ngo['name'] for ngo in ngos_list]
+    # Keyword matcher shared across subreddits, built on first use
+    matcher = get_matcher(ngos_list)
     
+    newest_created_utc = None
+    scanned = 0
+    listing_failed = False
+
     try:
-        submissions = subreddit.top(limit=MAX_POSTS_PER_SUBREDDIT)
+        if submissions is None:
+            # Window bounds and incremental mark as epoch seconds, computed once per subreddit
+            window = get_date_window(target_date, date_range)
+            submissions = list_submissions(subreddit, MAX_POSTS_PER_SUBREDDIT, window,
+                                           get_newer_than(state, subreddit_name))
+
+        # Listings are lazy: private, banned or missing subreddits raise on the first fetch in this loop
+        for idx, submission in enumerate(submissions, start=1):
+            scanned = idx
+            if state:
+                newest_created_utc = max(newest_created_utc or submission.created_utc, submission.created_utc)
+
+            post_content = f"{submission.title} {submission.selftext}"
+
+            # Exact matching of every keyword in one pass over the post; if no exact match
+            # is found, fall back to fuzzy matching on non-acronym NGO names only.
+            matched_ngos = matcher.match_ngos_with_fuzzy_name(post_content, fuzzy_threshold)
+
+            # Proceed only if at least one NGO is matched
+            if matched_ngos:
+                ngos_found.update(matched_ngos)
+                posts_data.append(submission_to_record(submission))
+            
+                for ngo_id in matched_ngos:
+                    ngo_content_data.append({
+                        'ngo_id': ngo_id,
+                        'external_content_id': submission.id  # To be mapped during import
+                    })
+
+                # Scrape comments for the post, or leave them to the comment workers
+                if comment_queue is not None:
+                    comment_queue.put(submission)
+                else:
+                    scraped_comment_tree = scrape_post_comments(submission.comments, submission_id=submission.id)
+                    comments_data.extend(scraped_comment_tree)
+
+            if idx % 100 == 0:
+                print(f"Processed post {idx}/{MAX_POSTS_PER_SUBREDDIT} in subreddit '{subreddit_name}'")
     except Exception as e:
         print(f"Error accessing subreddit '{subreddit_name}': {e}")
-        return posts_data, ngo_content_data, ngos_found
+        listing_failed = True
 
-    for idx, submission in enumerate(submissions, start=1):
-        post_content = f"{submission.title} {submission.selftext}"
-        matched_ngos = set()
-        metadata = json.dumps({
-            'url': submission.url,
-            'author': submission.author.name if submission.author else None
-        })
+    # Format the dates of all matched posts in one pass
+    normalize_timestamps(posts_data, 'published_at', unit='s')
 
-        # Filter posts based on target date and date range
-        created_at_dt = pd.to_datetime(submission.created_utc, unit='s')
-        if target_date:
-            target_date_dt = pd.to_datetime(target_date, format='%Y-%m-%d')
-            date_diff = (created_at_dt - target_date_dt).days
-            if abs(date_diff) > date_range:
-                continue
-        
-        # First, attempt exact matching using keywords.
-        for ngo in ngos_list:
-            for keyword in ngo['keywords']:
-                if keyword.isupper():
-                    # For acronyms, match only if the keyword appears as a whole word.
-                    pattern = rf"\b{re.escape(keyword)}\b"
-                    if re.search(pattern, post_content):
-                        matched_ngos.add(ngo['ngo_id'])
-                        break  # Stop checking keywords for this NGO
-                else:
-                    # For non-acronym keywords, perform a simple case-insensitive substring check.
-                    if keyword.lower() in post_content.lower():
-                        matched_ngos.add(ngo['ngo_id'])
-                        break  # Stop checking keywords for this NGO
-
-        # If no exact match found, attempt fuzzy matching on non-acronym NGOs only.
-        if not matched_ngos:
-            non_acronym_ngos = [ngo for ngo in ngos_list if not ngo['name'].isupper()]
-            non_acronym_names = [ngo['name'] for ngo in non_acronym_ngos]
-            if non_acronym_names:
-                best_match = process.extractOne(post_content, non_acronym_names, scorer=fuzz.partial_ratio)
-                if best_match:
-                    match_name, score = best_match
-                    if score >= fuzzy_threshold:
-                        # Find the corresponding NGO ID.
-                        ngo_id = next((ngo['ngo_id'] for ngo in non_acronym_ngos if ngo['name'] == match_name), None)
-                        if ngo_id:
-                            matched_ngos.add(ngo_id)
+    # Every scanned post counts towards the mark, matched or not. A listing cut off at
+    # MAX_POSTS_PER_SUBREDDIT, or by an error, may not have got back to the previous mark.
+    if state and newest_created_utc:
+        newest_published_at = format_timestamps([newest_created_utc], unit='s')[0]
+        state.update_mark('reddit', subreddit_name, [{'published_at': newest_published_at}],
+                          complete=not listing_failed and scanned < MAX_POSTS_PER_SUBREDDIT)
 
-        
-        # Proceed only if at least one NGO is matched
-        if matched_ngos:
-            ngos_found.update(matched_ngos)
-            created_at = pd.to_datetime(submission.created_utc, unit='s').strftime('%Y-%m-%d %H:%M:%S')
-
-            # Attempt to retrieve 'ups'; fallback to 'score' if 'ups' is unavailable
-            like_count = submission.ups if hasattr(submission, 'ups') else submission.score
-            
-            posts_data.append({
-                'external_content_id': submission.id,
-                'platform_id': PLATFORM_ID,
-                'title': submission.title,
-                'description': submission.selftext,
-                'url': submission.url,
-                'author': submission.author.name if submission.author else None,
-                'published_at': created_at,
-                'view_count': submission.score,
-                'like_count': like_count,
-                'comment_count': submission.num_comments,
-                'content_type': 'Post',
-                'metadata': metadata
-            })
-            
-            for ngo_id in matched_ngos:
-                ngo_content_data.append({
-                    'ngo_id': ngo_id,
-                    'external_content_id': submission.id  # To be mapped during import
-                })
-
-            # Scrape comments for the post
-            scraped_comment_tree = scrape_post_comments(submission.comments)
-            comments_data.extend(scraped_comment_tree)
-
-        if idx % 100 == 0:
-            print(f"Processed post {idx}/{MAX_POSTS_PER_SUBREDDIT} in subreddit '{subreddit_name}'")
-    
     print(f"Total matched posts in subreddit '{subreddit_name}': {len(posts_data)}")
     print(f"Total unique NGOs found in subreddit '{subreddit_name}': {len(ngos_found)}")
     
     return posts_data, ngo_content_data, ngos_found, comments_data
 
-def scrape_post_comments(comment_forest, limit=MAX_COMMENTS_PER_DEPTH, depth=MAX_DEPTH_PER_POST):
+def scrape_post_comments(comment_forest, limit=MAX_COMMENTS_PER_DEPTH, depth=MAX_DEPTH_PER_POST, submission_id=None):
     """
-    Recursively scrape comments from a Reddit post.
-    Set the 'limit' parameter to control the number of comments to scrape per depth.
+    Scrape comments from a Reddit post in a single breadth-first pass over its comment forest.
+    Set the 'limit' parameter to control the number of comments to scrape per comment (and at the top level).
     Set the 'depth' parameter to control the number of nested replies to scrape.
+    Pass the post's 'submission_id' to avoid looking it up for every comment.
     """
     if depth == 0:
         return []
-    
+
+    # Drop the "load more comments" placeholders of the whole tree once, without fetching them
     comment_forest.replace_more(limit=0)
-    comments = comment_forest.list()[:limit]
 
     comments_data = []
-
-    for comment in comments:
-
-        comment_data = {
+    queue = deque((comment, 1) for comment in comment_forest[:limit])
+    while queue:
+        comment, level = queue.popleft()
+        replies = comment.replies
+        if submission_id is None:
+            submission_id = comment.link_id.split('_', 1)[1]  # 't3_<id>', already loaded with the comment
+
+        comments_data.append({
             'comment_id': comment.id,
-            'post_external_id': comment.submission.id,
+            'post_external_id': submission_id,
             'author': comment.author.name if comment.author else None,
             'body': comment.body,
-            'created_at': pd.to_datetime(comment.created_utc, unit='s').strftime('%Y-%m-%d %H:%M:%S'),
+            'created_at': comment.created_utc,
             'like_count': comment.ups,
-            'reply_count': len(comment.replies),
+            'reply_count': len(replies),
             'parent_id': comment.parent_id,
             'metadata': json.dumps({
                 'permalink': comment.permalink
             })
-        }
-
-        comments_data.append(comment_data)
+        })
 
-        child_comments = scrape_post_comments(comment.replies, limit, depth-1)
-        comments_data.extend(child_comments)
+        if level < depth:
+            queue.extend((reply, level + 1) for reply in replies[:limit])
 
-    return comments_data
+    return normalize_timestamps(comments_data, 'created_at', unit='s')
 
-def save_content_to_csv(posts_data, filename="content.csv"):
+class CommentQueue:
     """
-    Save the content data to a CSV file.
+    Work queue fetching the comment trees of matched submissions on a pool of worker threads,
+    so that listing subreddits is not held up by comment requests.
+    Queued submissions are fetched in order of most comments, then highest score.
+    With a 'budget', at most that many comments are kept per run, and fetching only starts
+    once every submission is queued so that the budget goes to the busiest threads first:
+    each fetch reserves the comments its post can yield and returns what it did not use.
+    Each worker uses its own PRAW client from 'client_factory', since PRAW clients are not thread-safe.
+    Pass a record sink as 'sink' to write each post's comments to it as they are fetched,
+    instead of keeping them all in 'results' until the queue is closed.
     """
-    if not posts_data:
-        print("No posts matched with any NGO. No CSV file will be created for content.")
-        return
-    
-    df_content = pd.DataFrame(posts_data)
-    df_content = df_content[['external_content_id', 'platform_id', 'title', 'description', 'url', 'author', 'published_at', 'view_count', 'like_count', 'comment_count', 'content_type', 'metadata']]
-    df_content.to_csv(filename, index=False, encoding='utf-8-sig')
-    print(f"Content data has been saved to {filename}")
-
-def save_ngo_content_to_csv(ngo_content_data, filename="ngo_content.csv"):
-    """
-    Save the NGO-Content mapping data to a CSV file.
-    """
-    if not ngo_content_data:
-        print("No NGO-content mappings found. No CSV file will be created for ngo_content.")
-        return
-    
-    df_ngo_content = pd.DataFrame(ngo_content_data)
-    df_ngo_content.drop_duplicates(inplace=True)  # Remove duplicate mappings
-    df_ngo_content = df_ngo_content[['ngo_id', 'external_content_id']]
-    df_ngo_content.to_csv(filename, index=False, encoding='utf-8-sig')
-    print(f"NGO-Content mapping data has been saved to {filename}")
 
-def save_comments_to_csv(comments_data, filename="comments.csv"):
+    def __init__(self, client_factory, max_workers=DEFAULT_COMMENT_WORKERS, budget=None, sink=None):
+        self.client_factory = client_factory
+        self.max_workers = max(1, max_workers)
+        self.budget = budget
+        self.sink = sink
+        self._sink_lock = threading.Lock()
+        self.remaining = budget  # Comments neither kept nor reserved by a fetch in flight
+        self.results = {}
+        self._heap = []
+        self._queued = 0
+        self._in_flight = 0
+        self._closed = False
+        self._threads = []
+        self._condition = threading.Condition()
+
+    def put(self, submission):
+        """
+        Queue a submission for comment fetching.
+        """
+        with self._condition:
+            heapq.heappush(self._heap, (-submission.num_comments, -submission.score, self._queued, submission.id))
+            self._queued += 1
+            self._condition.notify()
+        if self.budget is None:
+            self._start()
+
+    def _start(self):
+        with self._condition:
+            if self._threads:
+                return
+            for _ in range(self.max_workers):
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        reddit = self.client_factory()
+        # Most comment rows scrape_post_comments can return for one post
+        max_comments_per_post = sum(MAX_COMMENTS_PER_DEPTH ** level for level in range(1, MAX_DEPTH_PER_POST + 1))
+        while True:
+            with self._condition:
+                while True:
+                    if self.remaining is not None and self.remaining <= 0:
+                        if not self._in_flight:
+                            return  # Budget spent
+                    elif self._heap:
+                        break
+                    elif self._closed:
+                        return
+                    self._condition.wait()
+                negative_num_comments, _, _, submission_id = heapq.heappop(self._heap)
+                reserved = 0
+                if self.remaining is not None:
+                    reserved = min(-negative_num_comments, max_comments_per_post, self.remaining)
+                    self.remaining -= reserved
+                self._in_flight += 1
+
+            try:
+                if negative_num_comments == 0 or (self.remaining is not None and not reserved):
+                    comments = []  # Nothing to fetch, or nothing left to keep
+                else:
+                    comments = scrape_post_comments(reddit.submission(id=submission_id).comments,
+                                                    submission_id=submission_id)
+            except Exception as e:
+                print(f"Error fetching comments for post '{submission_id}': {e}")
+                comments = []
+
+            with self._condition:
+                if self.remaining is not None:
+                    comments = comments[:reserved]
+                    self.remaining += reserved - len(comments)
+                if self.sink is None:
+                    self.results[submission_id] = comments
+
+            if self.sink is not None:
+                with self._sink_lock:
+                    self.sink.write_many(comments)
+
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def close(self, drain=True):
+        """
+        Wait until every queued submission is fetched (or the budget is spent).
+        With drain=False, drop the submissions still queued and only wait for the fetches in flight.
+        Returns a dict mapping submission IDs to their comment rows, empty when writing to a sink.
+        """
+        with self._condition:
+            self._closed = True
+            if not drain:
+                self._heap.clear()
+            self._condition.notify_all()
+        if self._queued and drain:
+            self._start()
+        for thread in self._threads:
+            thread.join()
+        skipped = len(self._heap)
+        if skipped:
+            print(f"Comment budget of {self.budget} spent; skipped comments of {skipped} posts.")
+        return self.results
+
+def stream_subreddit_posts(reddit, subreddit_names, ngos_list, sinks, fuzzy_threshold=90):
     """
-    Save the comments data to a CSV file.
+    Follow new submissions to all given subreddits through one multireddit stream and match
+    each one against the NGOs as it arrives, until interrupted.
+    Matched posts and their NGO mappings are written to the content and NGO-content 'sinks',
+    which flush them after their flush interval or batch size, whichever comes first.
+    Comments are not scraped, since new posts have hardly any yet.
+    Reddit API errors do not end the stream: it resumes after an exponential backoff.
     """
-    if not comments_data:
-        print("No comments found. No json file will be created for comments.")
-        return
-    
-    df_comments = pd.DataFrame(comments_data)
-    df_comments.to_csv(filename, index=False, encoding='utf-8-sig')
+    multireddit = reddit.subreddit("+".join(subreddit_names))
+    matcher = get_matcher(ngos_list)
+    already_written = sinks.content.accepted
+    skip_existing = True
+    attempt = 0
 
-    print(f"Comments data has been saved to {filename}")
+    print(f"Streaming new posts from {len(subreddit_names)} subreddits. Press Ctrl+C to stop.")
+    try:
+        while True:
+            try:
+                # pause_after=0 yields None whenever a poll brings nothing new, giving timed flushes a chance to run
+                for submission in multireddit.stream.submissions(skip_existing=skip_existing, pause_after=0):
+                    attempt = 0
+                    if submission is not None:
+                        matched_ngos = matcher.match_ngos_with_fuzzy_name(
+                            f"{submission.title} {submission.selftext}", fuzzy_threshold)
+                        if matched_ngos:
+                            sinks.content.write(normalize_timestamps([submission_to_record(submission)],
+                                                                     'published_at', unit='s')[0])
+                            for ngo_id in sorted(matched_ngos):
+                                sinks.ngo_content.write({'ngo_id': ngo_id, 'external_content_id': submission.id})
+
+                    sinks.flush_if_due()
+                break
+            except prawcore.exceptions.PrawcoreException as e:
+                # Keep what was matched so far, then resume the stream after a backoff. The new stream
+                # replays the latest posts so none submitted meanwhile are missed; the sinks skip repeats.
+                sinks.flush()
+                delay = min(STREAM_MAX_BACKOFF, STREAM_RETRY_DELAY * 2 ** attempt)
+                attempt += 1
+                skip_existing = False
+                print(f"Stream interrupted ({e}); resuming in {delay}s...")
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        print("\nStopping the stream.")
+
+    total_matched = sinks.content.accepted - already_written
+    print(f"Matched {total_matched} posts since the stream started")
+    return total_matched
 
 def main():
     """
@@ -283,6 +676,49 @@ def main():
         default=3,
         help="Number of days before and after target_date to include."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_SUBREDDIT_WORKERS,
+        help=("Number of subreddits scraped concurrently, sharing Reddit's rate limit. "
+              f"Default is {DEFAULT_SUBREDDIT_WORKERS} (one subreddit after another).")
+    )
+    parser.add_argument(
+        "--comment_workers",
+        type=int,
+        default=DEFAULT_COMMENT_WORKERS,
+        help=f"Number of threads fetching the comments of matched posts. Default is {DEFAULT_COMMENT_WORKERS}."
+    )
+    parser.add_argument(
+        "--comment_budget",
+        type=int,
+        default=None,
+        help=("Maximum number of comments to scrape per run, given to the posts with the most comments "
+              "first. Default is no limit.")
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=DEFAULT_SUBREDDIT_BATCH_SIZE,
+        help=("Number of subreddits listed together through one multireddit, with posts split back "
+              f"per subreddit, at most {MAX_SUBREDDIT_BATCH_SIZE} since Reddit listings end after about "
+              f"{REDDIT_LISTING_LIMIT} posts. Default is {DEFAULT_SUBREDDIT_BATCH_SIZE} (each subreddit listed on its own).")
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=("Keep running and match new posts to all subreddits as they are submitted, "
+              "appending matches to the content and NGO-content output. Stop with Ctrl+C.")
+    )
+    parser.add_argument(
+        "--flush_interval",
+        type=int,
+        default=STREAM_FLUSH_INTERVAL,
+        help=f"With --stream, seconds between appends of the matched posts. Default is {STREAM_FLUSH_INTERVAL}."
+    )
+    add_cache_arguments(parser)
+    add_state_arguments(parser)
+    add_sink_arguments(parser)
     
     args = parser.parse_args()
     
@@ -302,32 +738,61 @@ def main():
             sys.exit(1)
     
     try:
-        client_id, client_secret, user_agent = load_credentials()
-        reddit = initialize_reddit_client(client_id, client_secret, user_agent)
-        
-        all_posts_data = []
-        all_ngo_content_data = []
-        all_ngos_found = set()
-        all_comments_data = []
-        
-        for subreddit in subreddits_to_scrape:
-            print(f"Starting to scrape subreddit: {subreddit}")
-            posts_data, ngo_content_data, ngos_found, comments_data = scrape_subreddit_posts(
-                reddit, 
-                subreddit, 
-                ngos_list, 
-                fuzzy_threshold=90, 
-                target_date=args.target_date,
-                date_range=args.date_range
-            )
-            all_posts_data.extend(posts_data)
-            all_ngo_content_data.extend(ngo_content_data)
-            all_ngos_found.update(ngos_found)
-            all_comments_data.extend(comments_data)
-        
-        save_content_to_csv(all_posts_data)
-        save_ngo_content_to_csv(all_ngo_content_data)
-        save_comments_to_csv(all_comments_data)
+        credentials = load_credentials()
+        cache = cache_from_args(args)
+
+        if args.stream:
+            # The stream polls the same listing URL, so it must never be served from the cache
+            reddit = initialize_reddit_client(*credentials)
+            with sinks_from_args(args, append=True, flush_interval=args.flush_interval) as sinks:
+                stream_subreddit_posts(reddit, subreddits_to_scrape, ngos_list, sinks, fuzzy_threshold=90)
+            return
+
+        state = state_from_args(args)
+
+        # Listing and comment clients share one rate limit budget
+        rate_limiter = HeaderRateLimiter()
+        client_factory = lambda: initialize_reddit_client(*credentials, cache=cache, rate_limiter=rate_limiter)
+
+        # Records are written out as each subreddit is done, and comments as each post's tree is fetched.
+        # Incremental runs add their delta to the existing output instead of replacing it.
+        with sinks_from_args(args, append=bool(state)) as sinks:
+            comment_queue = CommentQueue(client_factory, args.comment_workers, args.comment_budget,
+                                         sink=sinks.comments)
+            scrape_options = {
+                'fuzzy_threshold': 90,
+                'target_date': args.target_date,
+                'date_range': args.date_range,
+                'state': state,
+                'comment_queue': comment_queue
+            }
+
+            all_ngos_found = set()
+
+            try:
+                if args.workers > 1:
+                    results = scrape_subreddits_in_parallel(subreddits_to_scrape, client_factory, ngos_list,
+                                                            args.workers, batch_size=args.batch_size, **scrape_options)
+                else:
+                    results = scrape_subreddits(client_factory(), subreddits_to_scrape, ngos_list, args.batch_size,
+                                                **scrape_options)
+
+                # Write the results in subreddit order
+                for posts_data, ngo_content_data, ngos_found, _ in results:
+                    sinks.content.write_many(posts_data)
+                    sinks.ngo_content.write_many(ngo_content_data)
+                    all_ngos_found.update(ngos_found)
+
+                # Wait for the comment workers to write out the remaining comments
+                comment_queue.close()
+                print(f"Total unique NGOs found across all subreddits: {len(all_ngos_found)}")
+            finally:
+                # If scraping failed, stop the comment workers before the sinks are closed under them
+                comment_queue.close(drain=False)
+
+        # Record the new marks only once the delta is saved.
+        if state:
+            state.save()
         
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -0,0 +1,185 @@
+# rematch_ngos.py
+
+import argparse
+import csv
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from ngos_list import ngos_list
+from ngo_matcher import get_matcher
+
+# Platform IDs used by the scrapers.
+REDDIT_PLATFORM_ID = 1
+YOUTUBE_PLATFORM_ID = 2
+BLUESKY_PLATFORM_ID = 3
+
+# Define the default number of CSV rows handed to a worker at a time
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def match_content_row(platform_id, title, description, fuzzy_threshold=90):
+    """
+    Return the set of NGO IDs for a content row, using the matching rules of the scraper that produced it.
+    YouTube videos use find_ngos_in_video rules, Reddit posts use scrape_subreddit_posts rules.
+    BlueSky posts were found by keyword search, so they are matched on exact keywords only.
+    """
+    text = f"{title} {description}"
+    if platform_id == YOUTUBE_PLATFORM_ID:
+        return get_matcher(ngos_list, acronym_ignore_case=True).match_ngos_with_fuzzy_keywords(text, fuzzy_threshold)
+    if platform_id == REDDIT_PLATFORM_ID:
+        return get_matcher(ngos_list).match_ngos_with_fuzzy_name(text, fuzzy_threshold)
+    return get_matcher(ngos_list, acronym_ignore_case=True).match_ngos(text)
+
+
+def match_content_chunk(rows, fuzzy_threshold=90):
+    """
+    Match a chunk of (external_content_id, platform_id, title, description) rows.
+    Returns a list of (ngo_id, external_content_id) pairs.
+    """
+    mappings = []
+    for external_content_id, platform_id, title, description in rows:
+        for ngo_id in sorted(match_content_row(platform_id, title, description, fuzzy_threshold)):
+            mappings.append((ngo_id, external_content_id))
+    return mappings
+
+
+def match_comment_chunk(rows):
+    """
+    Match a chunk of (post_external_id, body) comment rows on exact keywords only.
+    A comment mentioning an NGO attributes that NGO to the post it belongs to.
+    Returns a list of (ngo_id, external_content_id) pairs.
+    """
+    matcher = get_matcher(ngos_list)
+    mappings = []
+    for post_external_id, body in rows:
+        for ngo_id in sorted(matcher.match_ngos(body)):
+            mappings.append((ngo_id, post_external_id))
+    return mappings
+
+
+def read_content_chunks(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream a content CSV file as lists of (external_content_id, platform_id, title, description) rows.
+    """
+    reader = pd.read_csv(filename, usecols=['external_content_id', 'platform_id', 'title', 'description'],
+                         dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=chunk_size)
+    for df in reader:
+        platform_ids = pd.to_numeric(df['platform_id'], errors='coerce').fillna(0).astype(int)
+        yield list(zip(df['external_content_id'], platform_ids, df['title'], df['description']))
+
+
+def read_comment_chunks(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream a comments CSV file as lists of (post_external_id, body) rows.
+    """
+    reader = pd.read_csv(filename, usecols=['post_external_id', 'body'],
+                         dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=chunk_size)
+    for df in reader:
+        yield list(zip(df['post_external_id'], df['body']))
+
+
+def run_in_pool(executor, func, chunks, max_pending, *args):
+    """
+    Submit chunks to the process pool and yield their results in input order.
+    At most 'max_pending' chunks are in flight, so the input is streamed rather than loaded at once.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(func, chunk, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def rematch(content_file, output_file, comments_file=None, fuzzy_threshold=90,
+            chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Re-run NGO matching over previously scraped content and write a fresh NGO-content mapping file.
+    Returns the number of mappings written.
+    """
+    workers = workers or os.cpu_count() or 1
+    seen = set()
+    chunks_processed = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(output_file, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ngo_id', 'external_content_id'])
+
+        stages = [(match_content_chunk, read_content_chunks(content_file, chunk_size), (fuzzy_threshold,))]
+        if comments_file:
+            stages.append((match_comment_chunk, read_comment_chunks(comments_file, chunk_size), ()))
+
+        for func, chunks, args in stages:
+            for mappings in run_in_pool(executor, func, chunks, workers * 2, *args):
+                chunks_processed += 1
+                for mapping in mappings:
+                    # Remove duplicate mappings
+                    if mapping not in seen:
+                        seen.add(mapping)
+                        writer.writerow(mapping)
+                if chunks_processed % 10 == 0:
+                    print(f"Processed {chunks_processed} chunks, {len(seen)} NGO-content mappings so far")
+
+    print(f"NGO-Content mapping data has been saved to {output_file} ({len(seen)} mappings)")
+    return len(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-match NGOs in previously scraped content without calling any API"
+    )
+    parser.add_argument(
+        "--content",
+        type=str,
+        default="content.csv",
+        help="Content CSV file to re-match (default is content.csv)"
+    )
+    parser.add_argument(
+        "--comments",
+        type=str,
+        default=None,
+        help="Optional comments CSV file. NGOs mentioned in a comment are attributed to its post."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="ngo_content.csv",
+        help="NGO-content mapping CSV file to write (default is ngo_content.csv)"
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Number of rows per worker task (default is {DEFAULT_CHUNK_SIZE})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default is the number of CPUs)"
+    )
+    parser.add_argument(
+        "--fuzzy_threshold",
+        type=int,
+        default=90,
+        help="Minimum fuzzy matching score (default is 90)"
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.content):
+        print(f"Content file '{args.content}' not found.")
+        return
+    if args.comments and not os.path.exists(args.comments):
+        print(f"Comments file '{args.comments}' not found.")
+        return
+
+    rematch(args.content, args.output, comments_file=args.comments, fuzzy_threshold=args.fuzzy_threshold,
+            chunk_size=args.chunk_size, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
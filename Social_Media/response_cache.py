@@ -0,0 +1,175 @@
+# response_cache.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Cache modes shared by the scrapers' --cache_mode option:
+#   off     - never use the cache
+#   read    - serve cached responses, but do not store new ones
+#   write   - serve cached responses and store new ones
+#   refresh - ignore cached responses and store every new one
+CACHE_MODES = ["off", "read", "write", "refresh"]
+
+# Define the default cache file and its maximum size before the least recently used responses are evicted
+DEFAULT_CACHE_FILE = "response_cache.sqlite"
+DEFAULT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# Define how long cached responses stay fresh, in seconds, per endpoint
+DEFAULT_TTL = 24 * 3600
+ENDPOINT_TTLS = {
+    # BlueSky
+    "app.bsky.feed.searchPosts": 6 * 3600,
+    "app.bsky.feed.getPostThread": 6 * 3600,
+    # YouTube
+    "youtube.search.list": 7 * 24 * 3600,
+    "youtube.channels.list": 7 * 24 * 3600,
+    "youtube.playlistItems.list": 6 * 3600,
+    "youtube.videos.list": 24 * 3600,
+    "youtube.commentThreads.list": 24 * 3600,
+    "youtube.comments.list": 24 * 3600,
+    # Reddit
+    "reddit.listing": 6 * 3600,
+    "reddit.comments": 24 * 3600,
+}
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of API responses stored in SQLite.
+    Responses are keyed by endpoint and request parameters, expire after the endpoint's TTL,
+    and the least recently used ones are evicted once the cache exceeds 'max_bytes'.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, mode="write", max_bytes=DEFAULT_CACHE_MAX_BYTES, ttls=None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid cache mode '{mode}'. Choose from {CACHE_MODES}.")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.ttls = dict(ENDPOINT_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        self._conn = None
+        if mode != "off":
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, endpoint TEXT, body TEXT, size INTEGER,"
+                " created_at REAL, accessed_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(endpoint, params):
+        """
+        Return the cache key for an endpoint and its request parameters.
+        """
+        payload = json.dumps([endpoint, params or {}], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, endpoint, params):
+        """
+        Return the cached response for the request, or None if it is missing, expired or not readable in this mode.
+        """
+        if self.mode not in ("read", "write"):
+            return None
+        key = self.make_key(endpoint, params)
+        ttl = self.ttls.get(endpoint, DEFAULT_TTL)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT body, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if not row or now - row[1] > ttl:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, endpoint, params, response):
+        """
+        Store a JSON-serializable response for the request, if this mode writes to the cache.
+        """
+        if self.mode not in ("write", "refresh"):
+            return
+        key = self.make_key(endpoint, params)
+        body = json.dumps(response)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._total_bytes += len(body) - (row[0] if row else 0)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, len(body), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Delete the least recently used responses until the cache fits in max_bytes.
+        """
+        if self._total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if self._total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def fetch(self, endpoint, params, fetch_function):
+        """
+        Return the cached response for the request, or call 'fetch_function' and cache its result.
+        """
+        response = self.get(endpoint, params)
+        if response is not None:
+            return response
+        response = fetch_function()
+        self.set(endpoint, params, response)
+        return response
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def add_cache_arguments(parser):
+    """
+    Add the response cache options shared by all scrapers to an argument parser.
+    """
+    parser.add_argument(
+        "--cache_mode", "--cache-mode",
+        dest="cache_mode",
+        choices=CACHE_MODES,
+        default="off",
+        help=("Use the on-disk API response cache: 'read' serves cached responses, 'write' also stores "
+              "new ones, 'refresh' replaces them. Default is 'off'.")
+    )
+    parser.add_argument(
+        "--cache_file",
+        type=str,
+        default=DEFAULT_CACHE_FILE,
+        help=f"SQLite file holding cached API responses. Default is {DEFAULT_CACHE_FILE}."
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+        help="Size in MB above which the least recently used responses are evicted."
+    )
+
+
+def cache_from_args(args):
+    """
+    Create the response cache selected by the parsed command line arguments, or None if it is off.
+    """
+    if args.cache_mode == "off":
+        return None
+    return ResponseCache(args.cache_file, mode=args.cache_mode, max_bytes=args.cache_max_mb * 1024 * 1024)
@@ -0,0 +1,110 @@
+# scrape_state.py
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+# Define the default file holding the high-water marks of incremental runs
+DEFAULT_STATE_FILE = "scrape_state.json"
+
+
+class ScrapeState:
+    """
+    Persistent high-water marks for incremental scraping.
+    For every platform and source (keyword, channel or subreddit) the newest 'published_at'
+    seen so far is recorded, so that the next run only needs content published after it.
+    Marks use the scrapers' 'YYYY-MM-DD HH:MM:SS' UTC format and only ever move forward.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.marks = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.marks = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read scrape state '{path}' ({e}); starting from scratch.")
+
+    def get_mark(self, platform, source):
+        """
+        Return the newest 'published_at' recorded for a source, or None if it was never scraped.
+        """
+        with self._lock:
+            return self.marks.get(platform, {}).get(source, {}).get('published_at')
+
+    def update_mark(self, platform, source, records, date_field='published_at', complete=True):
+        """
+        Advance the mark of a source to the newest date among the given records.
+        Pass complete=False when a result cap stopped paging before it got back to the previous
+        mark: the records then leave a gap behind them, so a mark already set is kept, and the
+        next run fetches the newest items again instead of skipping the gap for good.
+        """
+        dates = [record[date_field] for record in records if record.get(date_field)]
+        if not dates:
+            return
+        newest = max(dates)
+        with self._lock:
+            entry = self.marks.setdefault(platform, {}).setdefault(source, {})
+            if entry.get('published_at') and not complete:
+                print(f"Result cap reached before the previous mark of {platform} source '{source}'; "
+                      "keeping the mark.")
+                return
+            if not entry.get('published_at') or newest > entry['published_at']:
+                entry['published_at'] = newest
+            entry['updated_at'] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    def save(self):
+        """
+        Write the marks to disk, replacing the previous file atomically.
+        """
+        with self._lock:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.marks, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+
+def is_newer(published_at, mark):
+    """
+    Check whether a 'YYYY-MM-DD HH:MM:SS' date is newer than the mark.
+    Always true without a mark, and for undated items, which cannot be placed against it.
+    """
+    return not mark or not published_at or published_at > mark
+
+
+def mark_to_rfc3339(mark):
+    """
+    Convert a mark to the 'YYYY-MM-DDTHH:MM:SSZ' format expected by the APIs' date filters.
+    """
+    return mark.replace(' ', 'T') + 'Z'
+
+
+def add_state_arguments(parser):
+    """
+    Add the incremental scraping options shared by all scrapers to an argument parser.
+    """
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=("Only fetch content published after the newest item seen by previous incremental runs "
+              "for each keyword, channel or subreddit, and record the new marks.")
+    )
+    parser.add_argument(
+        "--state_file",
+        type=str,
+        default=DEFAULT_STATE_FILE,
+        help=f"File holding the marks of incremental runs. Default is {DEFAULT_STATE_FILE}."
+    )
+
+
+def state_from_args(args):
+    """
+    Load the scrape state selected by the parsed command line arguments, or None if not incremental.
+    """
+    if not args.incremental:
+        return None
+    return ScrapeState(args.state_file)
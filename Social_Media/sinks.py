@@ -0,0 +1,314 @@
+# sinks.py
+
+import csv
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+
+import pandas as pd
+
+# Define the columns of the unified content, NGO-content and comments schemas, in file order
+CONTENT_COLUMNS = [
+    'external_content_id', 'platform_id', 'title', 'description', 'url', 'author',
+    'published_at', 'view_count', 'like_count', 'comment_count', 'content_type', 'metadata'
+]
+NGO_CONTENT_COLUMNS = ['ngo_id', 'external_content_id']
+COMMENT_COLUMNS = [
+    'comment_id', 'post_external_id', 'author', 'body',
+    'created_at', 'like_count', 'reply_count', 'parent_id', 'metadata'
+]
+
+# Define the columns identifying a row of each schema; rows with a key already written are skipped
+CONTENT_KEY_COLUMNS = ['external_content_id']
+NGO_CONTENT_KEY_COLUMNS = ['ngo_id', 'external_content_id']
+COMMENT_KEY_COLUMNS = ['comment_id']
+
+# Define the integer columns of the schemas; all other columns are stored as text in Parquet files
+INTEGER_COLUMNS = {'platform_id', 'view_count', 'like_count', 'comment_count', 'reply_count', 'ngo_id'}
+
+# Define when buffered records are written out and synced to disk
+DEFAULT_BATCH_SIZE = 500      # Records
+DEFAULT_FLUSH_INTERVAL = 30   # Seconds
+
+# Define the number of most recent keys each sink remembers to skip duplicate rows
+DEFAULT_DEDUP_WINDOW = 100000
+
+OUTPUT_FORMATS = ["csv", "parquet"]
+
+
+class RecordSink(ABC):
+    """
+    Write records with a fixed column order in batches as they arrive, instead of
+    collecting a whole run in memory. Buffered records are written and synced to disk
+    once 'batch_size' records are waiting or 'flush_interval' seconds have passed,
+    so an interrupted run keeps everything up to the last flush.
+    Records whose 'key_columns' values are among the last 'dedup_window' keys written
+    (in this run, or at the end of the existing output when appending) are skipped.
+    The window keeps memory flat however long the run is; repeats older than it are left
+    to the incremental marks, which keep later runs from fetching the same items again.
+    """
+
+    def __init__(self, path, columns, key_columns=None, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, append=False, dedup_window=DEFAULT_DEDUP_WINDOW):
+        self.path = path
+        self.columns = columns
+        self.key_columns = key_columns
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+        # A zero-byte file, e.g. left by a crashed run, is started over like a missing one
+        self.append = append and os.path.exists(path) and (os.path.isdir(path) or os.path.getsize(path) > 0)
+        self.accepted = 0  # Records taken in, excluding duplicates
+        self.written = 0   # Records flushed to disk
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._seen = OrderedDict()
+        if self.append and key_columns:
+            self._seen = OrderedDict.fromkeys(self._existing_keys())
+
+    def _key(self, record):
+        return tuple(str(record.get(column)) for column in self.key_columns)
+
+    @abstractmethod
+    def _existing_keys(self):
+        """
+        Return the keys of the last 'dedup_window' rows already in the output, oldest first.
+        """
+
+    @abstractmethod
+    def _write_rows(self, rows):
+        """
+        Write a batch of records to the output and sync it to disk.
+        """
+
+    def write(self, record):
+        """
+        Buffer a record, flushing the buffer if it is due.
+        """
+        if self.key_columns:
+            key = self._key(record)
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return
+            self._seen[key] = None
+            if len(self._seen) > self.dedup_window:
+                self._seen.popitem(last=False)
+        self.accepted += 1
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush_if_due(self):
+        """
+        Flush the buffer if 'flush_interval' seconds have passed since the last flush.
+        """
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records and sync them to disk.
+        """
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self.written += len(self._buffer)
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CSVSink(RecordSink):
+    """
+    Record sink writing a CSV file. The header is written when the file is created,
+    and every flush appends the buffered rows.
+    """
+
+    def __init__(self, path, columns, key_columns=None, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, append=False, dedup_window=DEFAULT_DEDUP_WINDOW):
+        super().__init__(path, columns, key_columns, batch_size, flush_interval, append, dedup_window)
+        self._file = open(path, 'a' if self.append else 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction='ignore',
+                                      lineterminator='\n')
+        if not self.append:
+            self._writer.writeheader()
+            self._sync()
+
+    def _existing_keys(self):
+        # Read the keys in chunks, keeping only the last ones
+        keys = deque(maxlen=self.dedup_window)
+        try:
+            for chunk in pd.read_csv(self.path, usecols=self.key_columns, dtype=str, keep_default_na=False,
+                                     encoding='utf-8-sig', chunksize=self.dedup_window):
+                keys.extend(chunk[self.key_columns].itertuples(index=False, name=None))
+        except pd.errors.EmptyDataError:
+            pass
+        return keys
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_rows(self, rows):
+        self._writer.writerows(rows)
+        self._sync()
+
+    def close(self):
+        if not self._file.closed:
+            super().close()
+            self._file.close()
+
+
+class ParquetSink(RecordSink):
+    """
+    Record sink writing a Parquet dataset: a directory holding one part file per flush.
+    Every part is a complete Parquet file, so the parts written before an interruption
+    stay readable, e.g. with pd.read_parquet(path). A dataset without records holds one
+    empty part. Requires pyarrow.
+    """
+
+    def __init__(self, path, columns, key_columns=None, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, append=False, dedup_window=DEFAULT_DEDUP_WINDOW):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing Parquet output requires pyarrow (pip install pyarrow).")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.schema = pyarrow.schema([
+            (column, pyarrow.int64() if column in INTEGER_COLUMNS else pyarrow.string()) for column in columns
+        ])
+        super().__init__(path, columns, key_columns, batch_size, flush_interval, append, dedup_window)
+
+        if not self.append and os.path.isdir(path):
+            for name in os.listdir(path):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(path, name))
+        os.makedirs(path, exist_ok=True)
+        self._parts = len([name for name in os.listdir(path) if name.startswith('part-')])
+
+    def _existing_keys(self):
+        # Read the newest parts first, until the window is full
+        keys = deque()
+        parts = sorted(name for name in os.listdir(self.path) if name.startswith('part-'))
+        for name in reversed(parts):
+            if len(keys) >= self.dedup_window:
+                break
+            existing = pd.read_parquet(os.path.join(self.path, name), columns=self.key_columns)
+            rows = list(existing[self.key_columns].astype(str).itertuples(index=False, name=None))
+            keys.extendleft(reversed(rows))
+        while len(keys) > self.dedup_window:
+            keys.popleft()
+        return keys
+
+    def _value(self, column, value):
+        if value is None or (isinstance(value, float) and value != value):
+            return None
+        if column in INTEGER_COLUMNS:
+            return int(value)
+        return str(value)
+
+    def _write_rows(self, rows):
+        data = {column: [self._value(column, row.get(column)) for row in rows] for column in self.columns}
+        table = self._pa.Table.from_pydict(data, schema=self.schema)
+        part_path = os.path.join(self.path, f"part-{self._parts:05d}.parquet")
+        self._pq.write_table(table, part_path)
+        with open(part_path, 'rb') as f:
+            os.fsync(f.fileno())
+        self._parts += 1
+
+    def close(self):
+        self.flush()
+        if self._parts == 0:
+            # Leave an empty part behind, so that readers still get the columns of the schema
+            self._write_rows([])
+
+
+def open_sink(path, columns, key_columns=None, **kwargs):
+    """
+    Open a Parquet sink for paths ending in '.parquet', or a CSV sink otherwise.
+    """
+    if path.endswith('.parquet'):
+        return ParquetSink(path, columns, key_columns, **kwargs)
+    return CSVSink(path, columns, key_columns, **kwargs)
+
+
+class ScrapeSinks:
+    """
+    The content, NGO-content and comments sinks of a scraper run, written as
+    content.csv, ngo_content.csv and comments.csv (or .parquet datasets).
+    Set 'append' to add to existing output, skipping rows among the last ones it holds.
+    """
+
+    def __init__(self, output_format="csv", append=False, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Invalid output format '{output_format}'. Choose from {OUTPUT_FORMATS}.")
+        options = {'batch_size': batch_size, 'flush_interval': flush_interval, 'append': append}
+        self.content = open_sink(f"content.{output_format}", CONTENT_COLUMNS, CONTENT_KEY_COLUMNS, **options)
+        self.ngo_content = open_sink(f"ngo_content.{output_format}", NGO_CONTENT_COLUMNS, NGO_CONTENT_KEY_COLUMNS,
+                                     **options)
+        self.comments = open_sink(f"comments.{output_format}", COMMENT_COLUMNS, COMMENT_KEY_COLUMNS, **options)
+        self.sinks = [self.content, self.ngo_content, self.comments]
+
+    def flush_if_due(self):
+        for sink in self.sinks:
+            sink.flush_if_due()
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        print(f"Saved {self.content.written} posts to {self.content.path}, "
+              f"{self.ngo_content.written} NGO-content mappings to {self.ngo_content.path} "
+              f"and {self.comments.written} comments to {self.comments.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def add_sink_arguments(parser):
+    """
+    Add the output options shared by all scrapers to an argument parser.
+    """
+    parser.add_argument(
+        "--output_format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help=("Write content, ngo_content and comments as CSV files, or as Parquet datasets "
+              "(directories of part files, requires pyarrow). Default is 'csv'.")
+    )
+    parser.add_argument(
+        "--flush_rows",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Number of buffered records written out at a time. Default is {DEFAULT_BATCH_SIZE}."
+    )
+
+
+def sinks_from_args(args, append=False, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """
+    Open the output sinks selected by the parsed command line arguments.
+    """
+    return ScrapeSinks(args.output_format, append=append, batch_size=args.flush_rows, flush_interval=flush_interval)
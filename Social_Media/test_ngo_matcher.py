@@ -0,0 +1,100 @@
+# test_ngo_matcher.py
+
+import random
+
+from thefuzz import fuzz, process
+from thefuzz.utils import full_process
+
+from ngos_list import ngos_list
+from ngo_matcher import NGOMatcher
+
+# Define the fuzzy thresholds checked, around the scrapers' default of 90
+THRESHOLDS = [80, 85, 90, 95]
+
+FILLER_WORDS = ["the", "a", "donate", "today", "relief", "help", "support", "our", "community", "news",
+                "foundation", "international", "children", "water", "health", "fund", "cross", "world"]
+
+
+def mutate(phrase, rng):
+    """
+    Apply a few random character edits to a phrase.
+    """
+    chars = list(phrase)
+    for _ in range(rng.randint(0, 3)):
+        if not chars:
+            break
+        position = rng.randrange(len(chars))
+        edit = rng.choice(["delete", "insert", "replace"])
+        if edit == "delete":
+            del chars[position]
+        elif edit == "insert":
+            chars.insert(position, rng.choice("abcdefghijklmnopqrstuvwxyz "))
+        else:
+            chars[position] = rng.choice("abcdefghijklmnopqrstuvwxyz ")
+    return "".join(chars)
+
+
+def sample_texts(count, seed=7):
+    """
+    Generate short and long (over 1000 characters) texts mentioning mutated NGO names and keywords.
+    """
+    rng = random.Random(seed)
+    phrases = [ngo['name'] for ngo in ngos_list] + [kw for ngo in ngos_list for kw in ngo['keywords']]
+    texts = []
+    for _ in range(count):
+        words = []
+        for _ in range(rng.choice([3, 20, 250])):
+            if rng.random() < 0.1:
+                words.append(mutate(rng.choice(phrases), rng))
+            else:
+                words.append(rng.choice(FILLER_WORDS))
+        texts.append(" ".join(words))
+    return texts
+
+
+def brute_force_keywords(matcher, text, fuzzy_threshold):
+    """
+    Score every non-acronym keyword against the text, as the YouTube scraper did before the index.
+    """
+    return {
+        keyword for keyword in matcher.substring_keywords
+        if fuzz.partial_ratio(keyword.lower(), text.lower()) >= fuzzy_threshold
+    }
+
+
+def brute_force_name(text, fuzzy_threshold):
+    """
+    Score every non-acronym NGO name against the text, as the Reddit scraper did before the index.
+    """
+    non_acronym_ngos = [ngo for ngo in ngos_list if not ngo['name'].isupper()]
+    best_match = process.extractOne(text, [ngo['name'] for ngo in non_acronym_ngos], scorer=fuzz.partial_ratio)
+    if not best_match or best_match[1] < fuzzy_threshold:
+        return None
+    return next(ngo['ngo_id'] for ngo in non_acronym_ngos if ngo['name'] == best_match[0])
+
+
+def test_sample_texts_include_long_texts():
+    assert any(len(text) > 1000 for text in sample_texts(200))
+
+
+def test_fuzzy_keywords_match_full_scan():
+    matcher = NGOMatcher(ngos_list)
+    for text in sample_texts(200):
+        for threshold in THRESHOLDS:
+            assert matcher.fuzzy_match_keywords(text, threshold) == brute_force_keywords(matcher, text, threshold)
+
+
+def test_fuzzy_name_matches_full_scan():
+    matcher = NGOMatcher(ngos_list)
+    for text in sample_texts(200):
+        if not full_process(text):
+            continue
+        for threshold in THRESHOLDS:
+            assert matcher.fuzzy_match_name(text, threshold) == brute_force_name(text, threshold)
+
+
+def test_index_prunes_long_texts():
+    matcher = NGOMatcher(ngos_list)
+    index = matcher._keyword_index
+    long_texts = [text.lower() for text in sample_texts(200) if len(text) > 1000]
+    assert any(len(index.candidates(text, 89.5)) < len(index.strings) for text in long_texts)
@@ -1,33 +1,31 @@
 # youtube/youtube_scraper.py
 
 from googleapiclient.discovery import build
-import pandas as pd
+from googleapiclient.http import build_http
 import argparse
 import os
 from dotenv import load_dotenv
-import re
-from thefuzz import fuzz, process
 import json
-import sys
 import random
-from collections import defaultdict
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qsl
 
 from ngos_list import ngos_list  # Import NGOs list from the separate file
+from ngo_matcher import get_matcher
+from rate_limiter import RateLimiter
+from response_cache import add_cache_arguments, cache_from_args
+from scrape_state import add_state_arguments, state_from_args, is_newer, mark_to_rfc3339
+from normalize import normalize_timestamps
+from sinks import add_sink_arguments, sinks_from_args
 
 # Set a constant for Youtube platform_id.
 PLATFORM_ID = 2
 
-# Load API credentials from the .env file
-load_dotenv()
-API_KEY = os.getenv('YOUTUBE_API_KEY')
-
-# Check if API_KEY is set
-if not API_KEY:
-    raise ValueError("Please provide a valid YouTube API Key in the .env file.")
-
-# Initialize the YouTube API client
-youtube = build('youtube', 'v3', developerKey=API_KEY)
+# YouTube API client, built on first use by get_youtube_client()
+youtube = None
+youtube_client_lock = threading.Lock()
 
 # Define the maximum number of unique channels to scrape by default
 DEFAULT_MAX_CHANNELS = 10
@@ -38,86 +36,342 @@ DEFAULT_MAX_COMMENTS = 30
 # Define whether to fetch nested comments or not
 FETCH_NESTED_COMMENTS = False
 
+# Define the maximum number of replies to scrape per video when fetching nested comments
+DEFAULT_MAX_REPLIES_PER_VIDEO = 100
+
+# Define the number of reply threads paged through concurrently, shared by all videos
+DEFAULT_REPLY_WORKERS = 8
+
+# Define the number of videos whose comments are fetched concurrently
+DEFAULT_COMMENT_WORKERS = 8
+
+# Define the maximum number of comment requests per second across all workers
+DEFAULT_COMMENT_REQUESTS_PER_SECOND = 10
+
+# Define the maximum number of video IDs the API accepts per videos().list call
+MAX_IDS_PER_VIDEOS_REQUEST = 50
+
+# Define the file caching channel name to channel ID resolutions between runs
+CHANNEL_CACHE_FILE = 'channel_cache.json'
+
+# Define how many days resolved and unresolved channel names stay cached
+CHANNEL_CACHE_TTL_DAYS = 30
+CHANNEL_CACHE_NEGATIVE_TTL_DAYS = 7
+
+# Channel resolution cache, loaded from CHANNEL_CACHE_FILE on first use
+channel_cache = None
+
+# Whether cached channel resolutions are ignored (and replaced) during this run
+refresh_channel_cache = False
+
+# On-disk API response cache, set from the --cache_mode option (None disables it)
+response_cache = None
+
+def get_youtube_client():
+    """
+    Return the YouTube API client, building it on first use.
+    The client is built from the discovery document bundled with google-api-python-client,
+    so no network request is made before the first API call.
+    """
+    global youtube
+    with youtube_client_lock:
+        if youtube is None:
+            # Load API credentials from the .env file
+            load_dotenv()
+            api_key = os.getenv('YOUTUBE_API_KEY')
+
+            # Check if the API key is set
+            if not api_key:
+                raise ValueError("Please provide a valid YouTube API Key in the .env file.")
+
+            youtube = build('youtube', 'v3', developerKey=api_key, static_discovery=True)
+    return youtube
+
+def load_channel_cache():
+    """
+    Load the channel resolution cache from disk, once per run.
+    Returns a dict mapping channel names to {'channel_id', 'resolved_at'} entries.
+    """
+    global channel_cache
+    if channel_cache is None:
+        channel_cache = {}
+        if CHANNEL_CACHE_FILE and os.path.exists(CHANNEL_CACHE_FILE):
+            try:
+                with open(CHANNEL_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    channel_cache = json.load(f)
+            except Exception as e:
+                print(f"Error reading channel cache '{CHANNEL_CACHE_FILE}': {e}")
+    return channel_cache
+
+def save_channel_cache():
+    """
+    Write the channel resolution cache to disk, replacing the previous file atomically.
+    """
+    if not CHANNEL_CACHE_FILE or channel_cache is None:
+        return
+    tmp_file = f"{CHANNEL_CACHE_FILE}.tmp"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(channel_cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, CHANNEL_CACHE_FILE)
+    except Exception as e:
+        print(f"Error writing channel cache '{CHANNEL_CACHE_FILE}': {e}")
+
+def get_cached_channel_id(channel_name):
+    """
+    Look up a channel name in the channel resolution cache.
+    Returns (True, channel_id) for a fresh entry, where channel_id is None for names
+    known not to resolve, or (False, None) if the name has to be searched.
+    """
+    entry = load_channel_cache().get(channel_name)
+    if not entry or refresh_channel_cache:
+        return False, None
+    ttl_days = CHANNEL_CACHE_TTL_DAYS if entry['channel_id'] else CHANNEL_CACHE_NEGATIVE_TTL_DAYS
+    if datetime.now().timestamp() - entry['resolved_at'] > ttl_days * 86400:
+        return False, None
+    return True, entry['channel_id']
+
 def get_channel_id_by_name(channel_name):
     """
     Resolve the YouTube channel ID from the channel name.
     Returns None if the channel cannot be found.
+    Resolutions, including names that do not resolve, are cached on disk so
+    later runs do not spend search quota on them again.
     """
-    request = youtube.search().list(
+    found, channel_id = get_cached_channel_id(channel_name)
+    if found:
+        return channel_id
+
+    request = get_youtube_client().search().list(
         part='snippet',
         q=channel_name,
         type='channel',
         maxResults=1
     )
     try:
-        response = request.execute()
+        response = execute_request(request)
     except Exception as e:
+        # Errors are not cached, so the name is searched again on the next run.
         print(f"Error executing search request for channel '{channel_name}': {e}")
         return None
 
     if response.get('items'):
-        return response['items'][0]['snippet']['channelId']
+        channel_id = response['items'][0]['snippet']['channelId']
     else:
-        return None  # Instead of raising, return None to handle gracefully
+        channel_id = None  # Instead of raising, return None to handle gracefully
+
+    load_channel_cache()[channel_name] = {
+        'channel_id': channel_id,
+        'resolved_at': datetime.now().timestamp()
+    }
+    save_channel_cache()
+    return channel_id
+
+def resolve_ngo_channel(ngo):
+    """
+    Resolve the YouTube channel of an NGO by its name, then by its keywords.
+    Returns (channel_name, channel_id), or (None, None) if no channel can be found.
+    """
+    channel_id = get_channel_id_by_name(ngo['name'])
+    if channel_id:
+        return ngo['name'], channel_id
+
+    # Attempt to resolve using keywords
+    for keyword in ngo['keywords']:
+        channel_id = get_channel_id_by_name(keyword)
+        if channel_id:
+            return keyword, channel_id  # Stop after finding the first matching keyword
+    return None, None
+
+def prewarm_channel_cache(ngos_list):
+    """
+    Resolve the channel of every NGO so that later runs are served from the cache.
+    """
+    resolved = 0
+    for ngo in ngos_list:
+        channel_name, channel_id = resolve_ngo_channel(ngo)
+        if channel_id:
+            resolved += 1
+            print(f"Resolved NGO '{ngo['name']}' using '{channel_name}' to channel ID: {channel_id}")
+        else:
+            print(f"Could not resolve a YouTube channel for NGO '{ngo['name']}' using name or keywords.")
+    print(f"\nResolved {resolved}/{len(ngos_list)} NGOs. Channel cache saved to {CHANNEL_CACHE_FILE}")
+
+def video_item_to_record(item):
+    """
+    Convert a videos().list item to a record following the unified schema.
+    'published_at' holds the raw publishedAt date until normalize_timestamps formats the batch.
+    """
+    video_id = item['id']
+    return {
+        'external_content_id': video_id,
+        'platform_id': PLATFORM_ID,
+        'title': item['snippet']['title'],
+        'description': item['snippet']['description'],
+        'url': f"https://www.youtube.com/watch?v={video_id}",
+        'author': item['snippet']['channelTitle'],
+        'published_at': item['snippet']['publishedAt'],
+        'view_count': int(item['statistics'].get('viewCount', 0)),
+        'like_count': int(item['statistics'].get('likeCount', 0)),
+        'comment_count': int(item['statistics'].get('commentCount', 0)),
+        'content_type': 'Video',
+        'metadata': json.dumps({
+            'duration': item.get('contentDetails', {}).get('duration', None)
+        })
+    }
+
+def get_videos_details(video_ids):
+    """
+    Get details of many videos by video ID, requesting up to 50 IDs per call.
+    Returns records in the order of the given IDs; IDs the API does not return
+    (deleted, private or failed requests) are skipped.
+    """
+    video_details = {}
+    for start in range(0, len(video_ids), MAX_IDS_PER_VIDEOS_REQUEST):
+        batch = video_ids[start:start + MAX_IDS_PER_VIDEOS_REQUEST]
+        request = get_youtube_client().videos().list(
+            part='snippet,statistics,contentDetails',
+            id=','.join(batch)
+        )
+        try:
+            response = execute_request(request)
+        except Exception as e:
+            print(f"Error fetching details for video IDs {batch}: {e}")
+            continue
+
+        for item in response.get('items', []):
+            video_details[item['id']] = video_item_to_record(item)
+
+        missing_ids = [video_id for video_id in batch if video_id not in video_details]
+        if missing_ids:
+            print(f"No details returned for video IDs: {', '.join(missing_ids)}")
+
+    records = [video_details[video_id] for video_id in dict.fromkeys(video_ids) if video_id in video_details]
+    return normalize_timestamps(records, 'published_at')
 
 def get_video_details(video_id):
     """
     Get details of a specific video by video ID.
     """
-    request = youtube.videos().list(
-        part='snippet,statistics,contentDetails',
-        id=video_id
-    )
-    try:
-        response = request.execute()
-    except Exception as e:
-        print(f"Error fetching details for video ID '{video_id}': {e}")
-        return []
-
-    video_details = []
-    for item in response.get('items', []):
-        # Convert publishedAt to desired format
-        published_at = pd.to_datetime(item['snippet']['publishedAt']).strftime('%Y-%m-%d %H:%M:%S')
-        video_data = {
-            'external_content_id': video_id,
-            'platform_id': PLATFORM_ID,
-            'title': item['snippet']['title'],
-            'description': item['snippet']['description'],
-            'url': f"https://www.youtube.com/watch?v={video_id}",
-            'author': item['snippet']['channelTitle'],
-            'published_at': published_at,
-            'view_count': int(item['statistics'].get('viewCount', 0)),
-            'like_count': int(item['statistics'].get('likeCount', 0)),
-            'comment_count': int(item['statistics'].get('commentCount', 0)),
-            'content_type': 'Video',
-            'metadata': json.dumps({
-                'duration': item.get('contentDetails', {}).get('duration', None)
-            })
-        }
-        video_details.append(video_data)
-
-    
-
-    return video_details
-
-def get_comment_from_video(video_id, max_results=DEFAULT_MAX_COMMENTS, fetchNested=FETCH_NESTED_COMMENTS):
+    return get_videos_details([video_id])
+
+# The shared client's HTTP connection is not thread-safe, so each thread gets its own.
+thread_local = threading.local()
+
+# Limits comment requests across all threads
+comment_rate_limiter = RateLimiter(DEFAULT_COMMENT_REQUESTS_PER_SECOND)
+
+# Thread pool expanding reply threads, created on first use by get_reply_executor()
+reply_executor = None
+reply_executor_lock = threading.Lock()
+
+def execute_request(request, rate_limiter=None, http=None):
     """
-    Get comments from a specific YouTube video.
+    Execute an API request, serving it from the response cache when one is enabled.
+    Cached responses are keyed by API method (e.g. 'youtube.search.list') and request
+    parameters, leaving out the API key.
     """
-    comments = []
+    def fetch():
+        if rate_limiter:
+            rate_limiter.wait()
+        return request.execute(http=http)
+
+    if response_cache is None:
+        return fetch()
+    params = sorted((name, value) for name, value in parse_qsl(urlsplit(request.uri).query, keep_blank_values=True)
+                    if name != 'key')
+    return response_cache.fetch(request.methodId, params, fetch)
+
+def execute_in_thread(request, rate_limiter=None):
+    """
+    Execute an API request over an HTTP connection owned by the calling thread.
+    The connection comes from build_http, so it has the client library's default timeout.
+    """
+    if not hasattr(thread_local, 'http'):
+        thread_local.http = build_http()
+    return execute_request(request, rate_limiter, http=thread_local.http)
+
+def reply_to_record(reply, video_id):
+    """
+    Convert a reply comment resource to a record following the comments schema.
+    """
+    reply_snippet = reply['snippet']
+    return {
+        'comment_id': reply['id'],
+        'post_external_id': video_id,
+        'author': reply_snippet.get('authorDisplayName'),
+        'body': reply_snippet.get('textDisplay'),
+        'created_at': reply_snippet.get('publishedAt'),
+        'like_count': reply_snippet.get('likeCount', 0),
+        'reply_count': 0,  # Replies to a reply do not exist.
+        'parent_id': reply_snippet.get('parentId'),
+        'metadata': json.dumps({})
+    }
+
+def get_replies_to_comment(parent_id, video_id, max_results):
+    """
+    Get up to 'max_results' replies to a top-level comment, following pagination.
+    """
+    replies = []
     next_page_token = None
 
-    while len(comments) < max_results:
-        request = youtube.commentThreads().list(
+    while len(replies) < max_results:
+        request = get_youtube_client().comments().list(
             part='snippet',
+            parentId=parent_id,
+            maxResults=min(100, max_results - len(replies)),  # Max 100 per request
+            textFormat='plainText',
+            pageToken=next_page_token
+        )
+        try:
+            response = execute_in_thread(request, comment_rate_limiter)
+        except Exception as e:
+            print(f"Error fetching replies to comment ID '{parent_id}': {e}")
+            break
+
+        for reply in response.get('items', [])[:max_results - len(replies)]:
+            replies.append(reply_to_record(reply, video_id))
+
+        next_page_token = response.get('nextPageToken')
+        if not next_page_token:
+            break  # No more pages
+
+    return replies
+
+def get_reply_executor():
+    """
+    Return the thread pool expanding reply threads, shared by all videos.
+    Called from concurrent comment workers, so creation is locked to create a single pool.
+    """
+    global reply_executor
+    with reply_executor_lock:
+        if reply_executor is None:
+            reply_executor = ThreadPoolExecutor(max_workers=DEFAULT_REPLY_WORKERS)
+        return reply_executor
+
+def get_comment_from_video(video_id, max_results=DEFAULT_MAX_COMMENTS, fetchNested=FETCH_NESTED_COMMENTS,
+                           max_replies=DEFAULT_MAX_REPLIES_PER_VIDEO):
+    """
+    Get comments from a specific YouTube video.
+    'max_results' limits the top-level comments. With 'fetchNested', replies follow their
+    top-level comment, up to 'max_replies' per video; threads with more replies than
+    embedded in the thread are paged through concurrently.
+    Safe to call from several threads at once; requests share comment_rate_limiter.
+    """
+    threads = []
+    next_page_token = None
+
+    while len(threads) < max_results:
+        request = get_youtube_client().commentThreads().list(
+            part='snippet,replies' if fetchNested else 'snippet',
             videoId=video_id,
-            maxResults=min(100, max_results - len(comments)),  # Max 100 per request
+            maxResults=min(100, max_results - len(threads)),  # Max 100 per request
             order='relevance',
             textFormat='plainText',
             pageToken=next_page_token
         )
         try:
-            response = request.execute()
+            response = execute_in_thread(request, comment_rate_limiter)
         except Exception as e:
             print(f"Error fetching comments for video ID '{video_id}': {e}")
             break
@@ -135,57 +389,164 @@ def get_comment_from_video(video_id, max_results=DEFAULT_MAX_COMMENTS, fetchNest
                 'body': snippet.get('textDisplay'),
                 'created_at': snippet.get('publishedAt'),
                 'like_count': snippet.get('likeCount', 0),
-                'reply_count': snippet.get('totalReplyCount', 0),
+                'reply_count': item['snippet'].get('totalReplyCount', 0),
                 'parent_id': None,
                 'metadata': json.dumps({})
             }
-            comments.append(comment_data)
-
-            if fetchNested and 'replies' in item:
-                reply_list = item['replies']['comments']
-                max_reply_count = min(max_results, len(reply_list))
-
-                for reply in reply_list[:max_reply_count]:
-                    reply_snippet = reply['snippet']
-                    reply_data = {
-                        'comment_id': reply['id'],
-                        'post_external_id': video_id,
-                        'author': reply_snippet.get('authorDisplayName'),
-                        'body': reply_snippet.get('textDisplay'),
-                        'created_at': reply_snippet.get('publishedAt'),
-                        'like_count': reply_snippet.get('likeCount', 0),
-                        'reply_count': 0,  # Replies to a reply do not exist.
-                        'parent_id': reply_snippet.get('parentId'),
-                        'metadata': json.dumps({})
-                    }
-                    comments.append(reply_data)
+            threads.append((comment_data, item))
 
         next_page_token = response.get('nextPageToken')
         if not next_page_token:
             break  # No more pages
 
+    # Share the reply budget among threads in order; threads whose replies are all
+    # embedded need no extra request, the others are paged through concurrently.
+    replies_by_thread = [[] for _ in threads]
+    if fetchNested:
+        reply_budget = max_replies
+        pending = []
+        for idx, (comment_data, item) in enumerate(threads):
+            embedded = item.get('replies', {}).get('comments', [])
+            wanted = min(max(comment_data['reply_count'], len(embedded)), reply_budget)
+            reply_budget -= wanted
+            if wanted <= len(embedded):
+                replies_by_thread[idx] = [reply_to_record(reply, video_id) for reply in embedded[:wanted]]
+            else:
+                future = get_reply_executor().submit(get_replies_to_comment, comment_data['comment_id'], video_id, wanted)
+                pending.append((idx, future))
+        for idx, future in pending:
+            replies_by_thread[idx] = future.result()
+
+    comments = []
+    for (comment_data, _), replies in zip(threads, replies_by_thread):
+        comments.append(comment_data)
+        comments.extend(replies)
     return comments
 
-def get_videos_from_channel(channel_id, max_results=20, target_date=None, date_range=14):
+def get_comments_from_videos(video_ids, max_results=DEFAULT_MAX_COMMENTS, fetchNested=FETCH_NESTED_COMMENTS,
+                             max_workers=DEFAULT_COMMENT_WORKERS, max_replies=DEFAULT_MAX_REPLIES_PER_VIDEO):
+    """
+    Get comments from many YouTube videos concurrently.
+    'max_results', 'fetchNested' and 'max_replies' apply to each video as in get_comment_from_video.
+    Yields (video ID, comments) pairs in the order of the given IDs, as their comments arrive.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda video_id: get_comment_from_video(video_id, max_results, fetchNested, max_replies),
+                               video_ids)
+        yield from zip(video_ids, results)
+
+def get_publish_window(target_date, date_range):
+    """
+    Return the (start, end) datetimes, in UTC, of the window around the target date.
+    Returns (None, None) if no target date is given.
+    """
+    if not target_date:
+        return None, None
+    target_datetime = datetime.strptime(target_date, "%Y-%m-%d")
+    return target_datetime - timedelta(days=date_range), target_datetime + timedelta(days=date_range)
+
+def get_uploads_playlist_id(channel_id):
+    """
+    Get the ID of the playlist holding all uploads of a channel.
+    """
+    # Uploads playlist IDs are the channel ID with the 'UC' prefix replaced by 'UU'.
+    if channel_id.startswith('UC'):
+        return 'UU' + channel_id[2:]
+
+    request = get_youtube_client().channels().list(part='contentDetails', id=channel_id)
+    try:
+        response = execute_request(request)
+    except Exception as e:
+        print(f"Error fetching uploads playlist for channel ID '{channel_id}': {e}")
+        return None
+
+    items = response.get('items', [])
+    if not items:
+        return None
+    return items[0]['contentDetails']['relatedPlaylists'].get('uploads')
+
+def get_videos_from_uploads_playlist(channel_id, max_results=20, target_date=None, date_range=14, newer_than=None):
+    """
+    Get a list of videos from a specific YouTube channel through its uploads playlist.
+    Costs 1 quota unit per page instead of 100 for search().list. The playlist is newest
+    first, so paging stops as soon as videos are older than the target date window,
+    or not newer than the 'newer_than' published_at mark of a previous incremental run.
+    """
+    video_ids = []
+    next_page_token = None
+    start_date, end_date = get_publish_window(target_date, date_range)
+
+    playlist_id = get_uploads_playlist_id(channel_id)
+    if not playlist_id:
+        print(f"Could not find the uploads playlist for channel ID '{channel_id}'.")
+        return video_ids
+
+    while len(video_ids) < max_results:
+        request = get_youtube_client().playlistItems().list(
+            part='contentDetails',
+            playlistId=playlist_id,
+            maxResults=50,  # Max 50 per request; items outside the window are filtered locally
+            pageToken=next_page_token
+        )
+        try:
+            response = execute_request(request)
+        except Exception as e:
+            print(f"Error fetching videos for channel ID '{channel_id}': {e}")
+            break
+
+        reached_window_start = False
+        for item in response.get('items', []):
+            content_details = item['contentDetails']
+            if newer_than and content_details.get('videoPublishedAt'):
+                published_at = content_details['videoPublishedAt'][:19].replace('T', ' ')
+                if not is_newer(published_at, newer_than):
+                    reached_window_start = True  # Everything after this video was seen by a previous run
+                    break
+            if start_date:
+                published_at = content_details.get('videoPublishedAt')
+                if not published_at:
+                    continue  # Private or deleted videos have no publication date
+                published_at = datetime.strptime(published_at[:19], "%Y-%m-%dT%H:%M:%S")
+                if published_at > end_date:
+                    continue
+                if published_at < start_date:
+                    reached_window_start = True
+                    break
+            video_ids.append(content_details['videoId'])
+            if len(video_ids) >= max_results:
+                break
+
+        next_page_token = response.get('nextPageToken')
+        if reached_window_start or not next_page_token:
+            break  # No more pages within the window
+
+    return video_ids
+
+def get_videos_from_channel(channel_id, max_results=20, target_date=None, date_range=14, listing='search',
+                            newer_than=None):
     """
     Get a list of videos from a specific YouTube channel.
+    Set 'listing' to 'uploads' to read the channel's uploads playlist instead of using search.
+    Pass the 'newer_than' published_at mark of a previous incremental run to only list newer videos.
     """
+    if listing == 'uploads':
+        return get_videos_from_uploads_playlist(channel_id, max_results, target_date, date_range, newer_than)
+
     video_ids = []
     next_page_token = None
     publishedAfter=None
     publishedBefore=None
-    
-    if target_date:
-        target_datetime = datetime.strptime(target_date, "%Y-%m-%d")
-        start_date = target_datetime - timedelta(days=date_range)
-        end_date = target_datetime + timedelta(days=date_range)
 
+    start_date, end_date = get_publish_window(target_date, date_range)
+    if start_date:
         publishedAfter=start_date.strftime("%Y-%m-%dT%H:%M:%SZ")
         publishedBefore=end_date.strftime("%Y-%m-%dT%H:%M:%SZ")
-
+    if newer_than:
+        publishedAfter=max(publishedAfter or "", mark_to_rfc3339(newer_than))
 
     while len(video_ids) < max_results:
-        request = youtube.search().list(
+        request = get_youtube_client().search().list(
             part='snippet',
             channelId=channel_id,
             maxResults=min(50, max_results - len(video_ids)),  # Max 50 per request
@@ -196,7 +557,7 @@ def get_videos_from_channel(channel_id, max_results=20, target_date=None, date_r
             publishedBefore=publishedBefore
         )
         try:
-            response = request.execute()
+            response = execute_request(request)
         except Exception as e:
             print(f"Error fetching videos for channel ID '{channel_id}': {e}")
             break
@@ -220,44 +581,17 @@ def find_ngos_in_video(video_data, ngos_list, fuzzy_threshold=90):
     For acronym keywords, match only complete words.
     Includes fuzzy matching with a specified threshold.
     """
-    ngos_found = set()
+    matcher = get_matcher(ngos_list, acronym_ignore_case=True)
     video_text = f"{video_data['title']} {video_data['description']}"
 
-    # Prepare a mapping from keywords to NGO IDs
-    keyword_to_ngo = {}
-    for ngo in ngos_list:
-        for keyword in ngo['keywords']:
-            keyword_to_ngo[keyword] = ngo['ngo_id']
-
-    # Exact and Fuzzy Matching with special handling for acronyms
-    for keyword, ngo_id in keyword_to_ngo.items():
-        if keyword.isupper():
-            # For acronyms, perform a whole-word match using regex.
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, video_text, re.IGNORECASE):
-                ngos_found.add(ngo_id)
-        else:
-            # For non-acronym keywords, use an exact substring match.
-            if keyword.lower() in video_text.lower():
-                ngos_found.add(ngo_id)
-            else:
-                # Apply fuzzy matching if an exact match is not found.
-                ratio = fuzz.partial_ratio(keyword.lower(), video_text.lower())
-                if ratio >= fuzzy_threshold:
-                    ngos_found.add(ngo_id)
+    # Exact matching of every keyword in one pass, then fuzzy matching of the non-acronym keywords
+    ngos_found = matcher.match_ngos_with_fuzzy_keywords(video_text, fuzzy_threshold)
 
     return list(ngos_found)
 
-def append_to_csv(df, file_path, columns):
-    """
-    Append DataFrame to a CSV file without overwriting if the file exists.
-    """
-    if os.path.exists(file_path):
-        df.to_csv(file_path, mode='a', header=False, index=False, encoding='utf-8-sig', columns=columns)
-    else:
-        df.to_csv(file_path, mode='w', header=True, index=False, encoding='utf-8-sig', columns=columns)
-
 def main():
+    global CHANNEL_CACHE_FILE, refresh_channel_cache, comment_rate_limiter, response_cache
+
     # Argument parsing to accept multiple channel names and max results from the command line
     parser = argparse.ArgumentParser(description="YouTube Channel Scraper for Non-profits")
     parser.add_argument(
@@ -284,8 +618,71 @@ def main():
         default=14,
         help="Number of days before and after the target date to search for videos"
     )
+    parser.add_argument(
+        "--fetch_nested",
+        action="store_true",
+        default=FETCH_NESTED_COMMENTS,
+        help="Also scrape replies to comments, paging through threads with many replies"
+    )
+    parser.add_argument(
+        "--max_replies",
+        type=int,
+        default=DEFAULT_MAX_REPLIES_PER_VIDEO,
+        help=f"Maximum number of replies to scrape per video with --fetch_nested (default is {DEFAULT_MAX_REPLIES_PER_VIDEO})"
+    )
+    parser.add_argument(
+        "--comment_workers",
+        type=int,
+        default=DEFAULT_COMMENT_WORKERS,
+        help=f"Number of videos whose comments are fetched concurrently (default is {DEFAULT_COMMENT_WORKERS})"
+    )
+    parser.add_argument(
+        "--comment_rps",
+        type=float,
+        default=DEFAULT_COMMENT_REQUESTS_PER_SECOND,
+        help=f"Maximum comment requests per second across all workers (default is {DEFAULT_COMMENT_REQUESTS_PER_SECOND})"
+    )
+    parser.add_argument(
+        "--listing",
+        choices=["search", "uploads"],
+        default="search",
+        help=("List channel videos with search ('search', 100 quota units per page) or through the "
+              "channel's uploads playlist ('uploads', 1 quota unit per page). Default is 'search'.")
+    )
+    parser.add_argument(
+        "--channel_cache",
+        type=str,
+        default=CHANNEL_CACHE_FILE,
+        help=f"File caching channel name resolutions between runs (default is {CHANNEL_CACHE_FILE})"
+    )
+    parser.add_argument(
+        "--refresh_channel_cache",
+        action="store_true",
+        help="Ignore cached channel resolutions and search every channel name again"
+    )
+    parser.add_argument(
+        "--prewarm_channel_cache",
+        action="store_true",
+        help="Resolve the channels of all NGOs in ngos_list into the cache, then exit"
+    )
+    add_cache_arguments(parser)
+    add_state_arguments(parser)
+    add_sink_arguments(parser)
     args = parser.parse_args()
 
+    CHANNEL_CACHE_FILE = args.channel_cache
+    refresh_channel_cache = args.refresh_channel_cache
+    comment_rate_limiter = RateLimiter(args.comment_rps)
+    response_cache = cache_from_args(args)
+    state = state_from_args(args)
+
+    # Fail early on missing credentials, before any scraping starts
+    get_youtube_client()
+
+    if args.prewarm_channel_cache:
+        prewarm_channel_cache(ngos_list)
+        return
+
     # Determine which channels to scrape
     if args.channel_names:
         # Scrape channels provided via CLI
@@ -313,23 +710,16 @@ def main():
         for ngo in ngos_shuffled:
             ngo_id = ngo['ngo_id']
             ngo_name = ngo['name']
-            channel_id = get_channel_id_by_name(ngo_name)
+            channel_name, channel_id = resolve_ngo_channel(ngo)
 
             if channel_id:
-                channels_to_scrape.append({'ngo_id': ngo_id, 'channel_name': ngo_name, 'channel_id': channel_id})
-                print(f"Resolved NGO '{ngo_name}' to channel ID: {channel_id}")
+                channels_to_scrape.append({'ngo_id': ngo_id, 'channel_name': channel_name, 'channel_id': channel_id})
+                if channel_name == ngo_name:
+                    print(f"Resolved NGO '{ngo_name}' to channel ID: {channel_id}")
+                else:
+                    print(f"Resolved NGO '{ngo_name}' using keyword '{channel_name}' to channel ID: {channel_id}")
             else:
-                # Attempt to resolve using keywords
-                found = False
-                for keyword in ngo['keywords']:
-                    channel_id_keyword = get_channel_id_by_name(keyword)
-                    if channel_id_keyword:
-                        channels_to_scrape.append({'ngo_id': ngo_id, 'channel_name': keyword, 'channel_id': channel_id_keyword})
-                        print(f"Resolved NGO '{ngo_name}' using keyword '{keyword}' to channel ID: {channel_id_keyword}")
-                        found = True
-                        break  # Stop after finding the first matching keyword
-                if not found:
-                    print(f"Could not resolve a YouTube channel for NGO '{ngo_name}' using name or keywords.")
+                print(f"Could not resolve a YouTube channel for NGO '{ngo_name}' using name or keywords.")
 
             # Check if we've reached the desired number of channels
             if len(channels_to_scrape) >= DEFAULT_MAX_CHANNELS:
@@ -341,86 +731,67 @@ def main():
             return
 
     try:
-        all_video_details = []
-        all_comments = []
-        ngo_content_data = []
-        ngos_found_overall = set()
-
-        for channel_info in channels_to_scrape:
-            ngo_id = channel_info['ngo_id']
-            channel_name = channel_info['channel_name']
-            channel_id = channel_info['channel_id']
-            print(f"\nScraping channel: {channel_name} (Channel ID: {channel_id})")
-
-            try:
-                # Get the list of video IDs from the channel
-                video_ids = get_videos_from_channel(channel_id, max_results=args.max_results, target_date=args.target_date, date_range=args.date_range)
-                print(f"Found {len(video_ids)} videos in channel '{channel_name}'.")
-
-                # Get details for each video and check for NGO mentions
-                for video_id in video_ids:
-                    video_details = get_video_details(video_id)
+        # Records are written out per channel and per video, appending to the existing output
+        with sinks_from_args(args, append=True) as sinks:
+            scraped_videos = 0
+            comment_video_ids = []
+            ngos_found_overall = set()
+
+            for channel_info in channels_to_scrape:
+                ngo_id = channel_info['ngo_id']
+                channel_name = channel_info['channel_name']
+                channel_id = channel_info['channel_id']
+                print(f"\nScraping channel: {channel_name} (Channel ID: {channel_id})")
+
+                try:
+                    # Get the list of video IDs from the channel, only newer ones in incremental mode
+                    newer_than = state.get_mark('youtube', channel_id) if state else None
+                    video_ids = get_videos_from_channel(channel_id, max_results=args.max_results, target_date=args.target_date, date_range=args.date_range, listing=args.listing, newer_than=newer_than)
+                    print(f"Found {len(video_ids)} videos in channel '{channel_name}'.")
+                    # A listing cut off at max_results may stop short of the previous mark
+                    listing_complete = len(video_ids) < args.max_results
+
+                    # Get details for all videos in batches and check for NGO mentions
+                    video_details = [video_data for video_data in get_videos_details(video_ids)
+                                     if is_newer(video_data['published_at'], newer_than)]
+                    video_ids = [video_data['external_content_id'] for video_data in video_details]
+                    if state:
+                        state.update_mark('youtube', channel_id, video_details, complete=listing_complete)
                     for video_data in video_details:
+                        video_id = video_data['external_content_id']
                         ngos_found_in_video = find_ngos_in_video(video_data, ngos_list, fuzzy_threshold=90)
-                        all_video_details.extend(video_details)
-                        if ngos_found_in_video:
-                            for found_ngo_id in ngos_found_in_video:
-                                ngos_found_overall.add(found_ngo_id)
-                                ngo_content_data.append({
-                                    'ngo_id': found_ngo_id,
-                                    'external_content_id': video_id
-                                })
+                        for found_ngo_id in ngos_found_in_video:
+                            ngos_found_overall.add(found_ngo_id)
+                            sinks.ngo_content.write({
+                                'ngo_id': found_ngo_id,
+                                'external_content_id': video_id
+                            })
+                    # Videos already saved, or scraped from another channel, are skipped by the sink
+                    sinks.content.write_many(video_details)
+                    scraped_videos += len(video_details)
 
-                    # Get comments for each video
-                    comments = get_comment_from_video(video_id, max_results=DEFAULT_MAX_COMMENTS)   
-                    all_comments.extend(comments)                      
+                    # Comments for all videos are fetched concurrently once every channel is listed
+                    comment_video_ids.extend(video_ids)
 
-                print(f"Completed scraping channel: {channel_name}")
+                    print(f"Completed scraping channel: {channel_name}")
 
-            except Exception as e:
-                print(f"An error occurred while scraping channel '{channel_name}': {e}")
-
-        # Remove duplicates from all_video_details based on 'external_content_id'
-        unique_video_ids = set()
-        unique_video_details = []
-        for video in all_video_details:
-            if video['external_content_id'] not in unique_video_ids:
-                unique_video_ids.add(video['external_content_id'])
-                unique_video_details.append(video)
-
-        # Save all content details to CSV, appending if file exists
-        if unique_video_details:
-            df_content = pd.DataFrame(unique_video_details)
-            df_content = df_content[['external_content_id', 'platform_id', 'title', 'description', 'url', 'author', 
-                                     'published_at', 'view_count', 'like_count', 'comment_count', 'content_type', 'metadata']]
-            append_to_csv(df_content, 'content.csv', [
-                'external_content_id', 'platform_id', 'title', 'description', 'url', 'author', 
-                'published_at', 'view_count', 'like_count', 'comment_count', 'content_type', 'metadata'
-            ])
-            print(f"\nScraped {len(unique_video_details)} unique videos and saved to content.csv")
-        else:
-            print("\nNo video details to save to content.csv")
-
-        # Save comments to CSV, appending if file exists
-        if all_comments:
-            df_comments = pd.DataFrame(all_comments)
-            # Ensure the DataFrame columns match the schema: comment_id, post_external_id, author, body, created_at, like_count, reply_count, parent_id, metadata
-            df_comments = df_comments[['comment_id', 'post_external_id', 'author', 'body', 'created_at', 'like_count', 'reply_count', 'parent_id', 'metadata']]
-            append_to_csv(df_comments, 'comments.csv', ['comment_id', 'post_external_id', 'author', 'body', 'created_at', 'like_count', 'reply_count', 'parent_id', 'metadata'])
-            print(f"Scraped {len(all_comments)} comments and saved to comments.csv")
-        else:
-            print("No comments to save to comments.csv")
-
-        # Save NGO mentions to CSV, appending if file exists
-        if ngo_content_data:
-            df_ngo_content = pd.DataFrame(ngo_content_data)
-            df_ngo_content.drop_duplicates(inplace=True)  # Remove duplicate mappings
-            df_ngo_content = df_ngo_content[['ngo_id', 'external_content_id']]
-            append_to_csv(df_ngo_content, 'ngo_content.csv', ['ngo_id', 'external_content_id'])
-            print(f"NGO-related data has been saved to ngo_content.csv")
+                except Exception as e:
+                    print(f"An error occurred while scraping channel '{channel_name}': {e}")
+
+            print(f"\nScraped {scraped_videos} videos, {sinks.content.accepted} of them new to {sinks.content.path}")
             print(f"Total unique NGOs found across all channels: {len(ngos_found_overall)}")
-        else:
-            print("No NGO-related content found. No ngo_content.csv file created.")
+
+            # Get comments for each video, saving them video by video
+            print(f"\nFetching comments for {len(comment_video_ids)} videos...")
+            for video_id, comments in get_comments_from_videos(comment_video_ids, max_results=DEFAULT_MAX_COMMENTS,
+                                                               fetchNested=args.fetch_nested,
+                                                               max_workers=args.comment_workers,
+                                                               max_replies=args.max_replies):
+                sinks.comments.write_many(normalize_timestamps(comments, 'created_at'))
+
+        # Record the new marks only once the delta is saved.
+        if state:
+            state.save()
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")